@@ -0,0 +1,285 @@
+"""
+Asyncio controller for driving several Ultimus V dispensers from one process.
+
+Each AsyncDispenserController owns one serial port and an asyncio.Lock that
+keeps the ENQ ... EOT exchange atomic. Waiting for the device never blocks
+the event loop: received bytes are collected by a reader callback on the
+port's file descriptor, and every wait is an awaitable with a deadline.
+
+    async with AsyncDispenserController('/dev/ttyUSB0') as dispenser:
+        await dispenser.set_pressure(12.5)
+        values = await dispenser.read_memory(3)
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+import serial
+
+from nordson_dispenser_control import ACK_TIMEOUT, PORT_ERRORS, RESPONSE_TIMEOUT, READ_POLL_INTERVAL
+from nordson_metrics import TransactionMetrics
+from nordson_recovery import Disconnected
+from nordson_protocol import ENQ, ACK, EOT, COMMANDS, FrameDecoder, encode, encode_command, parse_memory_values
+
+
+class AsyncDispenserController:
+    def __init__(self, port, ack_timeout=ACK_TIMEOUT, response_timeout=RESPONSE_TIMEOUT):
+        self.logger = logging.getLogger('AsyncDispenserController')
+        self.port = port
+        self.ack_timeout = ack_timeout
+        self.response_timeout = response_timeout
+        self.ser = None
+
+        # Serializes transactions on this port without blocking the loop
+        self.lock = asyncio.Lock()
+
+        # Bytes received but not consumed yet, and frames decoded from them
+        self._received = bytearray()
+        self._data_event = asyncio.Event()
+        self._read_error = None
+        self._reader_fd = None
+        self._poll_task = None
+        self.decoder = FrameDecoder()
+        self._frames = deque()
+
+        self.is_timed_mode = True
+        self.metrics = TransactionMetrics({'port': port})
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        """
+        Open the port in non-blocking mode and start collecting received bytes.
+        """
+        loop = asyncio.get_running_loop()
+        self.ser = await loop.run_in_executor(None, lambda: serial.Serial(
+            self.port,
+            baudrate=115200,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=0,  # reads return immediately with what is available
+        ))
+        self._read_error = None
+        try:
+            loop.add_reader(self.ser.fileno(), self._on_readable)
+            self._reader_fd = self.ser.fileno()
+        except (NotImplementedError, AttributeError):
+            # No selectable file descriptor (e.g. Windows): poll instead
+            self._poll_task = loop.create_task(self._poll_reader())
+        self.logger.info(f'Connected to {self.port}')
+
+    async def close(self):
+        if self.ser is None:
+            return
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+        self._remove_reader()
+        try:
+            self.ser.close()
+        except PORT_ERRORS:
+            pass
+        self.ser = None
+        self.logger.info(f'Disconnected from {self.port}')
+
+    def _remove_reader(self):
+        if self._reader_fd is not None:
+            asyncio.get_running_loop().remove_reader(self._reader_fd)
+            self._reader_fd = None
+
+    def _on_readable(self):
+        try:
+            data = self.ser.read(self.ser.in_waiting or 1)
+        except PORT_ERRORS as e:
+            # Stop watching the dead descriptor; the waiting transaction
+            # fails with Disconnected
+            self._remove_reader()
+            self._read_error = Disconnected(f'Serial port failed: {e}')
+            data = b''
+        if data:
+            self._received += data
+        self._data_event.set()
+
+    async def _poll_reader(self):
+        while self._read_error is None:
+            try:
+                waiting = self.ser.in_waiting
+            except PORT_ERRORS as e:
+                self._read_error = Disconnected(f'Serial port failed: {e}')
+                self._data_event.set()
+                return
+            if waiting:
+                self._on_readable()
+            await asyncio.sleep(READ_POLL_INTERVAL)
+
+    async def _wait_for_data(self, deadline):
+        """
+        Wait until more bytes arrive. Returns False once the deadline passes.
+        """
+        if self._read_error:
+            raise self._read_error
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        self._data_event.clear()
+        try:
+            await asyncio.wait_for(self._data_event.wait(), remaining)
+        except asyncio.TimeoutError:
+            return False
+        if self._read_error:
+            raise self._read_error
+        return True
+
+    async def _read_byte(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self._received:
+            if not await self._wait_for_data(deadline):
+                return b''
+        byte = bytes(self._received[:1])
+        del self._received[:1]
+        return byte
+
+    async def _read_frame(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self._frames:
+            if self._received:
+                self._frames.extend(self.decoder.feed(self._received))
+                self._received.clear()
+                continue
+            if not await self._wait_for_data(deadline):
+                return None
+        return self._frames.popleft()
+
+    async def send_command(self, command_code, data, expect_response=False):
+        return await self.send_packet(encode_command(command_code, data if data else ''), expect_response)
+
+    async def send_packet(self, packet, expect_response=False):
+        """
+        Run one ENQ ... EOT transaction for an encoded packet.
+
+        Returns the data string for a successful read, True for a successful
+        write and None if the command failed, the device did not answer or
+        the port failed.
+        """
+        if self.ser is None:
+            raise serial.SerialException(f'{self.port} is not open')
+        async with self.lock:
+            command = packet[3:5].decode('ascii')
+            checksum_errors = self.decoder.checksum_errors
+            transaction_start = time.monotonic_ns()
+            try:
+                return await self._transact(command, packet, expect_response)
+            except (Disconnected,) + PORT_ERRORS as e:
+                self.metrics.increment(command, 'serial_error')
+                self.logger.error(f"Error communicating with {self.port}: {e}")
+                return None
+            finally:
+                self.metrics.record_phase(command, 'total', time.monotonic_ns() - transaction_start)
+                self.metrics.count_transaction(command)
+                if self.decoder.checksum_errors != checksum_errors:
+                    self.metrics.increment(command, 'checksum_mismatch', self.decoder.checksum_errors - checksum_errors)
+
+    async def _transact(self, command, packet, expect_response):
+        # Discard stale bytes, e.g. a late reply to a timed-out transaction
+        self._received.clear()
+        self._frames.clear()
+        self.decoder.reset()
+
+        self.ser.write(ENQ)
+        phase_start = time.monotonic_ns()
+        ack_response = await self._read_byte(self.ack_timeout)
+        if ack_response != ACK:
+            self.metrics.increment(command, 'missing_ack')
+            self.logger.warning(f"No ACK after ENQ on {self.port} (got {ack_response.hex() or 'nothing'}).")
+            return None
+        self.metrics.record_phase(command, 'enq_ack', time.monotonic_ns() - phase_start)
+
+        self.ser.write(packet)
+        phase_start = time.monotonic_ns()
+        response = await self._read_frame(self.response_timeout)
+        if response is None:
+            self.metrics.increment(command, 'timeout')
+            self.logger.warning(f"Timed out waiting for response on {self.port}.")
+            self.ser.write(EOT)
+            return None
+        self.metrics.record_phase(command, 'packet_response', time.monotonic_ns() - phase_start)
+
+        if response[:2] == b'A2':
+            self.metrics.increment(command, 'a2_failure')
+            self.logger.info(f'Received Failure Command (A2) on {self.port}.')
+            self.ser.write(EOT)
+            return None
+        if response[:2] != b'A0':
+            self.logger.info(f'Received response with command code {response[:2]}: {response}')
+            self.ser.write(EOT)
+            return None
+        if not expect_response:
+            self.ser.write(EOT)
+            return True
+
+        self.ser.write(ACK)
+        phase_start = time.monotonic_ns()
+        data_response = await self._read_frame(self.response_timeout)
+        if data_response is None:
+            self.metrics.increment(command, 'timeout')
+            self.logger.warning(f"Timed out waiting for data response on {self.port}.")
+            self.ser.write(EOT)
+            return None
+        data_received = time.monotonic_ns()
+        self.metrics.record_phase(command, 'ack_data', data_received - phase_start)
+        self.ser.write(EOT)
+        self.metrics.record_phase(command, 'data_eot', time.monotonic_ns() - data_received)
+        return data_response.decode('ascii', errors='ignore')
+
+    async def _execute(self, name, value=None):
+        # Validation happens while encoding, before anything is sent
+        packet = encode(name, value)
+        return await self.send_packet(packet, COMMANDS[name].expect_response)
+
+    async def start(self):
+        return bool(await self._execute('start'))
+
+    async def stop(self):
+        return bool(await self._execute('stop'))
+
+    async def toggle_mode(self):
+        result = bool(await self._execute('toggle_mode'))
+        if result:
+            self.is_timed_mode = not self.is_timed_mode
+        return result
+
+    async def set_pressure(self, psi):
+        return bool(await self._execute('pressure', psi))
+
+    async def set_vacuum(self, inches_h2o):
+        return bool(await self._execute('vacuum', inches_h2o))
+
+    async def set_time(self, seconds):
+        return bool(await self._execute('time', seconds))
+
+    async def set_pressure_units(self, unit):
+        return bool(await self._execute('pressure_units', unit))
+
+    async def set_vacuum_units(self, unit):
+        return bool(await self._execute('vacuum_units', unit))
+
+    async def read_memory(self, memory_location=0):
+        """
+        Read pressure, time and vacuum from a memory location (E8).
+        Returns MemoryValues, or None if the read failed.
+        """
+        response_data = await self._execute('read_values', memory_location)
+        if not response_data:
+            return None
+        try:
+            return parse_memory_values(response_data)
+        except ValueError as e:
+            self.logger.error(f"Error parsing response: {e}")
+            return None
@@ -0,0 +1,283 @@
+"""
+Latency and throughput benchmarks for the dispenser command path.
+
+Drives repeated start/pressure/time/read_values transactions against the
+pty emulator (default) or a serial port, measures the CPU cost of packet
+encoding and frame decoding, and writes the results as JSON:
+
+    python nordson_benchmark.py --iterations 500 --output bench.json
+    python nordson_benchmark.py --baseline bench.json   # fail on regressions
+    python nordson_benchmark.py --async-devices 8 --latency 0.002
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from contextlib import ExitStack
+
+from nordson_async import AsyncDispenserController
+from nordson_dispenser_control import DispenserController
+from nordson_emulator import UltimusEmulator
+from nordson_protocol import FrameDecoder, benchmark_decoder, encode_command, encode_frame
+
+# Transactions exercised by the benchmark, as CLI command strings. Writes
+# alternate between two values: the controller skips a write that matches
+# the confirmed device state, which would leave nothing to measure
+TRANSACTIONS = {
+    'start': ('start',),
+    'pressure': ('pressure 12.5', 'pressure 12.6'),
+    'time': ('time 0.5', 'time 0.6'),
+    'read_values': ('read_values 42',),
+}
+
+# Latency metrics where a larger value is a regression; everything else in
+# the report's 'transactions' section is a rate where smaller is worse
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'max_ms')
+
+
+def summarize_latencies(latencies_ns):
+    """
+    Return p50/p95/p99/mean/max (milliseconds) for a list of nanosecond samples.
+    """
+    samples = sorted(latencies_ns)
+    if len(samples) > 1:
+        cut_points = statistics.quantiles(samples, n=100, method='inclusive')
+        p50, p95, p99 = cut_points[49], cut_points[94], cut_points[98]
+    else:
+        p50 = p95 = p99 = samples[0]
+    return {
+        'count': len(samples),
+        'p50_ms': p50 / 1e6,
+        'p95_ms': p95 / 1e6,
+        'p99_ms': p99 / 1e6,
+        'mean_ms': statistics.fmean(samples) / 1e6,
+        'max_ms': samples[-1] / 1e6,
+    }
+
+
+def benchmark_transactions(controller, iterations, warmup=10):
+    """
+    Run each transaction `iterations` times and return per-command latency
+    percentiles and transactions per second.
+    """
+    results = {}
+    for name, command_strs in TRANSACTIONS.items():
+        for index in range(warmup):
+            controller.start_time = time.monotonic()
+            controller.dispenser_callback(command_strs[index % len(command_strs)])
+        latencies = []
+        started = time.perf_counter_ns()
+        for index in range(iterations):
+            command_str = command_strs[index % len(command_strs)]
+            begin = time.perf_counter_ns()
+            # Mirror run(), which stamps the start of every command
+            controller.start_time = time.monotonic()
+            controller.dispenser_callback(command_str)
+            latencies.append(time.perf_counter_ns() - begin)
+        elapsed = (time.perf_counter_ns() - started) / 1e9
+        summary = summarize_latencies(latencies)
+        summary['transactions_per_second'] = iterations / elapsed
+        results[name] = summary
+    return results
+
+
+def benchmark_encoding(controller, calls=20000):
+    """
+    CPU time per packet encoding for each benchmarked command. build_packet()
+    is memoized, so 'cpu_ns_per_call' times the encoder itself, bypassing the
+    cache, and 'cached_cpu_ns_per_call' the build_packet() cache hit.
+    """
+    packets = {
+        'start': ('DI  ', ''),
+        'pressure': ('PS  ', '0125'),
+        'time': ('DS  ', 'T5000'),
+        'read_values': ('E8', '042'),
+    }
+    encode_uncached = encode_command.__wrapped__
+    results = {}
+    for name, (command_code, data) in packets.items():
+        start = time.process_time_ns()
+        for _ in range(calls):
+            encode_uncached(command_code, data)
+        encoded = time.process_time_ns()
+        for _ in range(calls):
+            controller.build_packet(command_code, data)
+        results[name] = {
+            'cpu_ns_per_call': (encoded - start) / calls,
+            'cached_cpu_ns_per_call': (time.process_time_ns() - encoded) / calls,
+        }
+    return results
+
+
+def benchmark_decoding(calls=20000):
+    """
+    CPU time per FrameDecoder.feed() call for a reply and a data frame.
+    """
+    frames = {
+        'ack_reply': encode_frame(b'A0'),
+        'data_frame': encode_frame(b'D0PD0125DT05000VC0010'),
+    }
+    results = {}
+    for name, frame in frames.items():
+        decoder = FrameDecoder()
+        start = time.process_time_ns()
+        for _ in range(calls):
+            decoder.feed(frame)
+        results[name] = {'cpu_ns_per_call': (time.process_time_ns() - start) / calls}
+    return results
+
+
+async def _drive_async_device(dispenser, iterations, latencies):
+    for index in range(iterations):
+        begin = time.perf_counter_ns()
+        if index % 2:
+            await dispenser.read_memory(index % 400)
+        else:
+            await dispenser.set_pressure(12.5)
+        latencies.append(time.perf_counter_ns() - begin)
+
+
+async def _benchmark_async(ports, iterations):
+    dispensers = [AsyncDispenserController(port) for port in ports]
+    for dispenser in dispensers:
+        await dispenser.connect()
+    try:
+        latencies = []
+        started = time.perf_counter_ns()
+        await asyncio.gather(*(_drive_async_device(dispenser, iterations, latencies)
+                               for dispenser in dispensers))
+        elapsed = (time.perf_counter_ns() - started) / 1e9
+    finally:
+        for dispenser in dispensers:
+            await dispenser.close()
+    summary = summarize_latencies(latencies)
+    summary['devices'] = len(ports)
+    summary['transactions_per_second'] = len(latencies) / elapsed
+    return summary
+
+
+def benchmark_async(devices, iterations=200, latency=0.0):
+    """
+    Drive `devices` emulators concurrently from one event loop with
+    AsyncDispenserController, alternating PS writes and E8 reads, and return
+    the combined latency percentiles and transactions per second.
+    """
+    with ExitStack() as stack:
+        emulators = [stack.enter_context(UltimusEmulator(latency=latency)) for _ in range(devices)]
+        return asyncio.run(_benchmark_async([emulator.port for emulator in emulators], iterations))
+
+
+def run_benchmarks(port=None, iterations=200, latency=0.0):
+    """
+    Run the full suite and return the JSON-serializable report.
+    """
+    with ExitStack() as stack:
+        if port is None:
+            emulator = stack.enter_context(UltimusEmulator(latency=latency))
+            port = emulator.port
+            target = 'emulator'
+        else:
+            target = 'serial'
+        controller = DispenserController(port=port, init_delay=0)
+        stack.callback(controller.destroy)
+        # Logging every transaction would dominate the measurement
+        controller.logger.setLevel(logging.WARNING)
+        transactions = benchmark_transactions(controller, iterations)
+        encoding = benchmark_encoding(controller)
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': target,
+        'port': port,
+        'iterations': iterations,
+        'emulator_latency_s': latency if target == 'emulator' else None,
+        'transactions': transactions,
+        'encoding': encoding,
+        'decoding': benchmark_decoding(),
+        'decoder_throughput': benchmark_decoder(),
+    }
+
+
+def compare_reports(report, baseline, tolerance):
+    """
+    Return a list of human readable regressions of `report` against `baseline`,
+    where a metric is worse than the baseline by more than `tolerance` (a fraction).
+    """
+    regressions = []
+    for name, metrics in report['transactions'].items():
+        for metric, value in metrics.items():
+            reference = baseline.get('transactions', {}).get(name, {}).get(metric)
+            if not reference or metric == 'count':
+                continue
+            if metric in LOWER_IS_BETTER:
+                worse = value > reference * (1 + tolerance)
+            else:
+                worse = value < reference * (1 - tolerance)
+            if worse:
+                regressions.append(f'{name}.{metric}: {value:.3f} (baseline {reference:.3f})')
+    for section in ('encoding', 'decoding'):
+        for name, metrics in report[section].items():
+            reference = baseline.get(section, {}).get(name, {}).get('cpu_ns_per_call')
+            value = metrics['cpu_ns_per_call']
+            if reference and value > reference * (1 + tolerance):
+                regressions.append(f'{section}.{name}.cpu_ns_per_call: {value:.0f} (baseline {reference:.0f})')
+    return regressions
+
+
+def print_report(report):
+    print(f"Target: {report['target']} ({report['port']}), {report['iterations']} iterations per command")
+    for name, metrics in report['transactions'].items():
+        print(f"  {name:12s} p50 {metrics['p50_ms']:8.3f} ms  p95 {metrics['p95_ms']:8.3f} ms  "
+              f"p99 {metrics['p99_ms']:8.3f} ms  {metrics['transactions_per_second']:9.1f} tx/s")
+    for name, metrics in report['encoding'].items():
+        print(f"  encoding {name}: {metrics['cpu_ns_per_call']:.0f} ns CPU per call "
+              f"({metrics['cached_cpu_ns_per_call']:.0f} ns cached)")
+    for name, metrics in report['decoding'].items():
+        print(f"  decoding {name}: {metrics['cpu_ns_per_call']:.0f} ns CPU per call")
+    print(f"  decoder throughput: {report['decoder_throughput']['frames_per_second']:,.0f} frames/s")
+    if 'async' in report:
+        metrics = report['async']
+        print(f"  async, {metrics['devices']} devices: p50 {metrics['p50_ms']:.3f} ms  p99 {metrics['p99_ms']:.3f} ms  "
+              f"{metrics['transactions_per_second']:.1f} tx/s total")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dispenser command latency and throughput')
+    parser.add_argument('--port', help='serial port of a real or emulated device (default: start an emulator)')
+    parser.add_argument('--iterations', type=int, default=200, help='transactions per command')
+    parser.add_argument('--latency', type=float, default=0.0, help='emulator reply latency in seconds')
+    parser.add_argument('--async-devices', type=int, default=0,
+                        help='also drive this many emulators concurrently with AsyncDispenserController')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression as a fraction (default 0.2)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run_benchmarks(args.port, args.iterations, args.latency)
+    if args.async_devices:
+        report['async'] = benchmark_async(args.async_devices, args.iterations, args.latency)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""
+Capture the serial traffic of a live controller and replay it offline.
+
+A capture records every byte passing through ser.write/ser.read with its
+monotonic timestamp, in the trace file format of nordson_trace.py, plus one
+EVENT record per send_packet/probe call with its arguments, result and
+duration, written when the call returns.
+Replaying feeds the received bytes back to a fresh controller through
+ReplaySerial and checks that every call returns what it returned live:
+
+    python nordson_capture.py record field.bin --port /dev/ttyUSB0   # interactive session
+    python nordson_capture.py replay field.bin                     # as fast as possible
+    python nordson_capture.py replay field.bin --speed 1           # original timing
+    python nordson_capture.py bench field.bin --repeat 100         # frame decoder CPU time
+
+Received bytes are only handed out after the controller wrote everything
+that preceded them in the capture, so replay is deterministic regardless
+of speed. Captured timeouts and stray bytes are reproduced as recorded;
+each timeout still waits for the controller's deadline, so lower
+--ack-timeout/--response-timeout to replay failure-heavy captures faster.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import deque
+
+from nordson_dispenser_control import DispenserController, ACK_TIMEOUT, RESPONSE_TIMEOUT, READ_POLL_INTERVAL
+from nordson_protocol import FrameDecoder
+from nordson_trace import EVENT, RECORD_HEADER, RX, TX, load_trace, write_records
+
+
+class SerialCapture:
+    """
+    Wraps an open serial port and appends every write and read to a
+    capture file. Everything else is passed through to the port. Closing
+    the port leaves the capture file open, so recording continues on the
+    port the controller reconnects to (see attach()).
+    """
+
+    def __init__(self, ser, path):
+        self.ser = ser
+        self.path = path
+        self._file = open(path, 'wb')
+        write_records(self._file, [])
+        self.records = 0
+
+    def _record(self, direction, data):
+        self._file.write(RECORD_HEADER.pack(time.monotonic_ns(), direction, len(data)))
+        self._file.write(data)
+        self.records += 1
+
+    def write(self, data):
+        written = self.ser.write(data)
+        self._record(TX, bytes(data))
+        return written
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        if data:
+            self._record(RX, data)
+        return data
+
+    def record_event(self, **event):
+        self._record(EVENT, json.dumps(event).encode('utf-8'))
+
+    def attach(self, ser):
+        """
+        Record a newly opened port, e.g. after a reconnect. Returns self.
+        """
+        self.ser = ser
+        return self
+
+    def stop(self):
+        """
+        Close the capture file and return the wrapped port.
+        """
+        if not self._file.closed:
+            self._file.close()
+        return self.ser
+
+    def close(self):
+        self._file.flush()
+        self.ser.close()
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+
+def start_capture(controller, path):
+    """
+    Record all traffic of an open controller to `path` until
+    stop_capture(controller). Returns the SerialCapture.
+    """
+    capture = SerialCapture(controller.ser, path)
+    controller.ser = capture
+    # Ports opened by a reconnect are recorded too
+    controller.port_wrapper = capture.attach
+    send_packet = controller.send_packet
+    probe = controller.probe
+
+    def capturing_send_packet(packet, expect_response=False):
+        start = time.monotonic()
+        result = send_packet(packet, expect_response)
+        capture.record_event(call='send_packet', packet=packet.decode('latin-1'), expect_response=expect_response,
+                             result=result, seconds=round(time.monotonic() - start, 6))
+        return result
+
+    def capturing_probe(timeout=None):
+        start = time.monotonic()
+        result = probe(timeout)
+        capture.record_event(call='probe', timeout=timeout, result=result,
+                             seconds=round(time.monotonic() - start, 6))
+        return result
+
+    # Instance attributes shadow the methods until stop_capture()
+    controller.send_packet = capturing_send_packet
+    controller.probe = capturing_probe
+    return capture
+
+
+def stop_capture(controller):
+    """
+    Stop recording and close the capture file, also when the port is
+    currently disconnected.
+    """
+    capture = getattr(controller.port_wrapper, '__self__', None)
+    controller.port_wrapper = None
+    if isinstance(controller.ser, SerialCapture):
+        capture = controller.ser
+        controller.ser = capture.ser
+    if isinstance(capture, SerialCapture):
+        capture.stop()
+    controller.__dict__.pop('send_packet', None)
+    controller.__dict__.pop('probe', None)
+
+
+class ReplaySerial:
+    """
+    Serial-port stand-in that plays back the received side of a capture.
+    Each received chunk becomes readable once the controller has written
+    all bytes that preceded it; with `speed` set, also not before its
+    original delay after that write, divided by `speed`. Written bytes are
+    compared against the captured ones.
+    """
+
+    def __init__(self, records, speed=None):
+        self.port = 'replay'
+        self.timeout = READ_POLL_INTERVAL
+        self.is_open = True
+        self.speed = speed
+        transmitted = bytearray()
+        last_write_ns = None
+        self._pending = deque()
+        for record in records:
+            if record.direction == TX:
+                transmitted += record.data
+                last_write_ns = record.timestamp_ns
+            elif record.direction == RX:
+                delay_ns = record.timestamp_ns - last_write_ns if last_write_ns is not None else 0
+                self._pending.append((len(transmitted), delay_ns, record.data))
+        self.expected_tx = bytes(transmitted)
+        self._received = bytearray()
+        self._written = 0
+        self._last_write = time.monotonic()
+        self.tx_mismatches = 0
+        self.first_tx_mismatch = None
+
+    def _release(self):
+        """
+        Move due chunks to the receive buffer. Returns the time the next
+        chunk becomes due if only timing holds it back, else None.
+        """
+        while self._pending:
+            after_tx, delay_ns, data = self._pending[0]
+            if self._written < after_tx:
+                return None
+            if self.speed:
+                due = self._last_write + delay_ns / 1e9 / self.speed
+                if time.monotonic() < due:
+                    return due
+            self._received += data
+            self._pending.popleft()
+        return None
+
+    def write(self, data):
+        expected = self.expected_tx[self._written:self._written + len(data)]
+        if expected != data:
+            self.tx_mismatches += 1
+            if self.first_tx_mismatch is None:
+                self.first_tx_mismatch = (self._written, bytes(data), expected)
+        self._written += len(data)
+        self._last_write = time.monotonic()
+        return len(data)
+
+    def read(self, size=1):
+        due = self._release()
+        if not self._received:
+            # Block like a serial read with a timeout
+            wait = self.timeout if due is None else min(self.timeout, max(0.0, due - time.monotonic()))
+            time.sleep(wait)
+            self._release()
+        data = bytes(self._received[:size])
+        del self._received[:size]
+        return data
+
+    @property
+    def in_waiting(self):
+        self._release()
+        return len(self._received)
+
+    @property
+    def remaining(self):
+        return len(self._received) + sum(len(data) for _, _, data in self._pending)
+
+    def reset_input_buffer(self):
+        # The capture holds only bytes that were actually read, so nothing
+        # in it was discarded by the original reset
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def replay_capture(path, speed=None, **controller_options):
+    """
+    Replay the calls in a capture against a controller on ReplaySerial.
+    Returns a report dict; 'mismatches' lists calls whose result differs.
+    """
+    records = load_trace(path)
+    events = [json.loads(record.data) for record in records if record.direction == EVENT]
+    if not events:
+        raise ValueError(f'{path} contains no recorded calls')
+    transport = ReplaySerial(records, speed)
+    controller = DispenserController(port=transport, port_cache_path=None, **controller_options)
+    mismatches = []
+    cpu_seconds = 0.0
+    wall_start = time.perf_counter()
+    for index, event in enumerate(events):
+        cpu_start = time.process_time()
+        if event['call'] == 'probe':
+            result = controller.probe(event['timeout'])
+        else:
+            result = controller.send_packet(event['packet'].encode('latin-1'), event['expect_response'])
+        cpu_seconds += time.process_time() - cpu_start
+        if result != event['result']:
+            mismatches.append({'index': index, 'call': event['call'], 'packet': event.get('packet'),
+                               'expected': event['result'], 'replayed': result})
+    wall_seconds = time.perf_counter() - wall_start
+    return {
+        'calls': len(events),
+        'mismatches': mismatches,
+        'tx_mismatches': transport.tx_mismatches,
+        'first_tx_mismatch': repr(transport.first_tx_mismatch) if transport.first_tx_mismatch else None,
+        'unread_rx_bytes': transport.remaining,
+        'wall_s': wall_seconds,
+        'cpu_s': cpu_seconds,
+        'cpu_us_per_call': cpu_seconds / len(events) * 1e6,
+    }
+
+
+def benchmark_parser(path, repeat=1):
+    """
+    Feed the received bytes of a capture through FrameDecoder `repeat`
+    times, in the chunks they were read in, and measure the CPU time.
+    """
+    chunks = [record.data for record in load_trace(path) if record.direction == RX]
+    total_bytes = sum(len(chunk) for chunk in chunks)
+    decoder = FrameDecoder()
+    frames = 0
+    cpu_start = time.process_time()
+    for _ in range(repeat):
+        decoder.reset()
+        for chunk in chunks:
+            frames += len(decoder.feed(chunk))
+    cpu_seconds = time.process_time() - cpu_start
+    return {
+        'chunks': len(chunks) * repeat,
+        'bytes': total_bytes * repeat,
+        'frames': frames,
+        'checksum_errors': decoder.checksum_errors,
+        'framing_errors': decoder.framing_errors,
+        'cpu_s': cpu_seconds,
+        'frames_per_second': frames / cpu_seconds if cpu_seconds else None,
+        'megabytes_per_second': total_bytes * repeat / cpu_seconds / 1e6 if cpu_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture and replay Ultimus V serial traffic')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    record = subparsers.add_parser('record', help='run the interactive command line with capture on')
+    record.add_argument('capture', help='capture file to write')
+    record.add_argument('--port', help='serial port, e.g. /dev/ttyUSB0')
+
+    replay = subparsers.add_parser('replay', help='replay a capture and compare results')
+    replay.add_argument('capture', help='capture file')
+    replay.add_argument('--speed', type=float, default=None,
+                        help='1 for the original timing, 10 for 10x faster (default: as fast as possible)')
+    replay.add_argument('--ack-timeout', type=float, default=ACK_TIMEOUT, help='controller ACK deadline (s)')
+    replay.add_argument('--response-timeout', type=float, default=RESPONSE_TIMEOUT, help='controller response deadline (s)')
+
+    bench = subparsers.add_parser('bench', help='measure frame decoder CPU time over a capture')
+    bench.add_argument('capture', help='capture file')
+    bench.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.action == 'record':
+        logging.basicConfig(level=logging.INFO)
+        controller = DispenserController(port=args.port)
+        capture = start_capture(controller, args.capture)
+        controller.run()
+        stop_capture(controller)
+        print(f'Captured {capture.records} records to {args.capture}')
+        return
+
+    logging.basicConfig(level=logging.ERROR)
+    if args.action == 'replay':
+        report = replay_capture(args.capture, args.speed, ack_timeout=args.ack_timeout,
+                                response_timeout=args.response_timeout)
+    else:
+        report = benchmark_parser(args.capture, args.repeat)
+    print(json.dumps(report, indent=2))
+    if args.action == 'replay' and (report['mismatches'] or report['tx_mismatches']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
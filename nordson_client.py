@@ -0,0 +1,119 @@
+"""
+Lightweight client for nordson_daemon.py.
+
+Talks to the daemon over its Unix domain socket and does not import
+pyserial, so a one-shot call returns in milliseconds:
+
+    python nordson_client.py pressure 12.5
+    python nordson_client.py --device /dev/ttyUSB1 read_values 3
+
+    with DispenserClient() as client:
+        client.call('set_pressure', 12.5)
+        values = client.call('read_memory', 3)
+
+Protocol: one JSON object per line in each direction. A request holds
+either "command" (a command line as typed in the interactive CLI) or
+"method" with optional "args"/"kwargs", plus optional "device" and "id".
+The response is {"id": ..., "ok": true, "result": ...} or
+{"id": ..., "ok": false, "error": "...", "error_type": "NoAck"}, where
+error_type names the exception raised in the daemon (e.g. ValueError or
+one of the nordson_recovery errors). Plain text lines are accepted as
+commands too.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+
+
+def default_socket_path():
+    runtime_directory = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_directory:
+        return os.path.join(runtime_directory, 'nordson_ultimus.sock')
+    return f'/tmp/nordson_ultimus-{os.getuid()}.sock'
+
+
+DEFAULT_SOCKET_PATH = default_socket_path()
+
+
+class DaemonError(Exception):
+    """
+    The daemon rejected a request or the command raised an error;
+    `error_type` is the name of the exception raised in the daemon.
+    """
+
+    def __init__(self, message, error_type=None):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+class DispenserClient:
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=10.0):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(socket_path)
+        self._file = self.socket.makefile('rwb')
+        self._next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def request(self, request):
+        """
+        Send one request dict and return the result. Raises DaemonError if
+        the daemon answers with an error.
+        """
+        self._next_id += 1
+        request = dict(request, id=self._next_id)
+        self._file.write(json.dumps(request).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('Daemon closed the connection')
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise DaemonError(response.get('error', 'unknown error'), response.get('error_type'))
+        return response.get('result')
+
+    def call(self, method, *args, device=None, **kwargs):
+        """
+        Call a controller method, e.g. call('set_pressure', 12.5).
+        """
+        return self.request({'method': method, 'args': args, 'kwargs': kwargs, 'device': device})
+
+    def command(self, command_line, device=None):
+        """
+        Run a command line such as 'pressure 12.5'.
+        """
+        return self.request({'command': command_line, 'device': device})
+
+    def close(self):
+        self._file.close()
+        self.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send a command to the Nordson Ultimus V daemon')
+    parser.add_argument('command', nargs='+', help="command line, e.g. 'pressure 12.5', or 'devices'")
+    parser.add_argument('--device', help='device name when the daemon serves several dispensers')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help='daemon socket path')
+    args = parser.parse_args()
+
+    try:
+        with DispenserClient(args.socket) as client:
+            result = client.command(' '.join(args.command), args.device)
+    except DaemonError as e:
+        print(f'Error ({e.error_type}): {e}', file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
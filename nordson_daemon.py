@@ -0,0 +1,197 @@
+"""
+Long-running controller daemon with a local socket API.
+
+Keeps the dispenser port(s) open and serves nordson_client.py and any
+other local client over a Unix domain socket, so scripts do not pay port
+discovery, initialization and logging setup on every call:
+
+    python nordson_daemon.py --port /dev/ttyUSB0 --port /dev/ttyUSB1
+    python nordson_client.py --device /dev/ttyUSB1 pressure 12.5
+    echo 'read_values 3' | socat - UNIX-CONNECT:$XDG_RUNTIME_DIR/nordson_ultimus.sock
+
+Each device gets a non-merging DispenserWorker, so requests from any
+number of clients run one at a time on that device's ENQ ... EOT
+transaction, in arrival order, and every write is sent. The protocol is described in nordson_client.py.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+
+from nordson_client import DEFAULT_SOCKET_PATH
+from nordson_dispenser_control import DispenserController, parse_command
+from nordson_worker import DispenserWorker
+
+# Controller methods clients may call through "method" requests
+METHODS = {
+    'start', 'stop', 'toggle_mode', 'set_mode', 'set_pressure', 'set_vacuum', 'set_time',
+    'set_pressure_units', 'set_vacuum_units', 'select_memory', 'read_memory', 'sync_shadow',
+}
+
+# Requests answered by the daemon itself, without a transaction
+LOCAL_REQUESTS = ('devices', 'state', 'metrics')
+
+
+def to_json(result):
+    # MemoryValues and other namedtuples become objects
+    if hasattr(result, '_asdict'):
+        return result._asdict()
+    return result
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.daemon
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            response = daemon.handle_line(line.decode('utf-8', errors='replace'))
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DispenserDaemon:
+    def __init__(self, controllers, socket_path=DEFAULT_SOCKET_PATH):
+        """
+        `controllers` maps device names to connected DispenserControllers.
+        """
+        self.logger = logging.getLogger('DispenserDaemon')
+        self.controllers = dict(controllers)
+        # No merging: each client must get the result of its own write
+        self.workers = {name: DispenserWorker(controller, name=f'DispenserWorker-{name}', merge=False)
+                        for name, controller in self.controllers.items()}
+        self.socket_path = socket_path
+        self.server = None
+        self.requests = 0
+
+    def _device(self, name):
+        if name is None:
+            if len(self.controllers) != 1:
+                raise ValueError(f'Specify a device: {sorted(self.controllers)}')
+            return next(iter(self.controllers))
+        if name not in self.controllers:
+            raise ValueError(f'Unknown device {name}; available: {sorted(self.controllers)}')
+        return name
+
+    def handle_line(self, line):
+        """
+        Run one request line (JSON or a plain command line) and return the
+        response dict.
+        """
+        request_id = None
+        try:
+            request = json.loads(line) if line.startswith('{') else {'command': line}
+            request_id = request.get('id')
+            result = self.handle_request(request)
+        except json.JSONDecodeError as e:
+            return {'id': request_id, 'ok': False, 'error': f'Invalid JSON: {e}'}
+        except Exception as e:
+            return {'id': request_id, 'ok': False, 'error': str(e), 'error_type': type(e).__name__}
+        return {'id': request_id, 'ok': True, 'result': to_json(result)}
+
+    def handle_request(self, request):
+        self.requests += 1
+        command = request.get('command')
+        method = request.get('method')
+        if command is not None:
+            command = command.strip()
+            if command in LOCAL_REQUESTS:
+                method = command
+            else:
+                method, args = parse_command(command)
+                request = {'args': args, 'device': request.get('device')}
+        if method == 'devices':
+            return {name: controller.port for name, controller in self.controllers.items()}
+        device = self._device(request.get('device'))
+        controller = self.controllers[device]
+        if method == 'state':
+            return controller.shadow.as_dict()
+        if method == 'metrics':
+            return controller.metrics.snapshot()
+        if method not in METHODS:
+            raise ValueError(f'Unknown method {method}')
+        args = request.get('args') or []
+        kwargs = request.get('kwargs') or {}
+        # Runs on the device's worker thread, after requests queued before it
+        return self.workers[device].submit(method, *args, **kwargs).result()
+
+    def serve_forever(self):
+        """
+        Listen on the socket until shutdown() is called.
+        """
+        self._remove_stale_socket()
+        self.server = _Server(self.socket_path, _RequestHandler)
+        self.server.daemon = self
+        os.chmod(self.socket_path, 0o660)
+        self.logger.info(f'Serving {sorted(self.controllers)} on {self.socket_path}')
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            os.unlink(self.socket_path)
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            # Left behind by a daemon that did not shut down cleanly
+            os.unlink(self.socket_path)
+        else:
+            raise RuntimeError(f'Another daemon is already serving {self.socket_path}')
+        finally:
+            probe.close()
+
+    def shutdown(self):
+        if self.server:
+            # serve_forever() runs in another thread (or a signal handler
+            # interrupted it), so do not block on it here
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.close()
+        for controller in self.controllers.values():
+            controller.destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Ultimus V dispensers over a Unix domain socket')
+    parser.add_argument('--port', action='append', default=[],
+                        help='serial port to serve; repeat for several dispensers (default: auto-detect one)')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH, help='socket path')
+    parser.add_argument('--log-level', default='WARNING', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    logging.getLogger('DispenserDaemon').setLevel(logging.INFO)
+    # Failed commands raise typed errors, which clients receive as error responses
+    if args.port:
+        controllers = {port: DispenserController(port=port, raise_errors=True) for port in args.port}
+    else:
+        controller = DispenserController(raise_errors=True)
+        controllers = {controller.port or 'simulation': controller}
+
+    daemon = DispenserDaemon(controllers, args.socket)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.shutdown())
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,56 +1,351 @@
+import argparse
 import serial
 import logging
 import serial.tools.list_ports
+import json
+import random
+import threading
 import time
+from collections import deque
+
+try:
+    from termios import error as TermiosError
+except ImportError:  # Windows
+    TermiosError = OSError
+
+from nordson_metrics import TransactionMetrics
+from nordson_port_cache import CACHED_SETTINGS, DEFAULT_CACHE_PATH, PortCache
+from nordson_recovery import (
+    ChecksumError, CommandFailed, Disconnected, DispenserError, DispenserTimeout, NoAck, RetryPolicy,
+)
+from nordson_shadow import DeviceShadow, SETPOINTS
+from nordson_trace import TraceBuffer
+from nordson_protocol import (
+    ENQ, ACK, EOT, COMMANDS, FrameDecoder, encode, encode_command, parse_memory_values,
+)
+
+# Transaction deadlines (seconds). Each wait returns as soon as the expected
+# bytes arrive; these only bound how long we wait for a silent device.
+ACK_TIMEOUT = 0.2
+RESPONSE_TIMEOUT = 0.5
+
+# Serial read timeout. A blocking read wakes up immediately when data arrives,
+# so this only limits how far a wait can overshoot its deadline.
+READ_POLL_INTERVAL = 0.005
+
+# Time given to a freshly opened device before the first command (seconds)
+INIT_DELAY = 2.0
+
+# How long a cached port gets to answer the ENQ/ACK liveness check (seconds)
+LIVENESS_TIMEOUT = 0.5
+
+# Pause between attempts to reopen a dropped port, doubling up to the maximum
+RECONNECT_MIN_DELAY = 0.05
+RECONNECT_MAX_DELAY = 1.0
+
+# What a failing or unplugged port raises: pyserial errors, OSError from the
+# file descriptor and, on POSIX, termios.error from tcflush/tcsetattr
+PORT_ERRORS = (serial.SerialException, OSError, TermiosError)
+
+# Devices held open by a controller in this process. A reconnecting
+# controller never takes over a port another controller owns.
+_ports_in_use = set()
+_ports_lock = threading.Lock()
+
+
+def _claim_port(device):
+    with _ports_lock:
+        if device in _ports_in_use:
+            return False
+        _ports_in_use.add(device)
+        return True
+
+
+def _release_port(device):
+    with _ports_lock:
+        _ports_in_use.discard(device)
+
+
+# Command lines as typed in the interactive CLI: command -> (method,
+# argument type or None, whether the argument is required)
+COMMAND_LINES = {
+    'start': ('start', None, False),
+    'stop': ('stop', None, False),
+    'toggle_mode': ('toggle_mode', None, False),
+    'pressure': ('set_pressure', float, True),
+    'vacuum': ('set_vacuum', float, True),
+    'time': ('set_time', float, True),
+    'read_values': ('read_memory', int, False),
+    'select_memory': ('select_memory', int, True),
+    'sync_state': ('sync_shadow', int, False),
+    'set_pressure_units': ('set_pressure_units', str, True),
+    'set_vacuum_units': ('set_vacuum_units', str, True),
+}
+
+
+def parse_command(command_line):
+    """
+    Turn a command line such as 'pressure 12.5' into a (method, args) call.
+    Raises ValueError for unknown commands and malformed arguments. Shared
+    by dispenser_callback() and the daemon.
+    """
+    name, *arguments = command_line.split() or ['']
+    if name not in COMMAND_LINES:
+        raise ValueError(f'Unknown command: {command_line!r}; available: {sorted(COMMAND_LINES)}')
+    method, argument_type, required = COMMAND_LINES[name]
+    if argument_type is None:
+        usage = name
+    else:
+        usage = f'{name} <value>' if required else f'{name} [<value>]'
+    if len(arguments) > (argument_type is not None) or (required and not arguments):
+        raise ValueError(f'Invalid command format. Use: {usage}')
+    try:
+        return method, [argument_type(argument) for argument in arguments]
+    except ValueError:
+        raise ValueError(f'Invalid value {arguments[0]!r}. Use: {usage}') from None
+
 
 class DispenserController:
-    def __init__(self):
-        # Set up logging
-        logging.basicConfig(level=logging.DEBUG)
+    def __init__(self, port=None, ack_timeout=ACK_TIMEOUT, response_timeout=RESPONSE_TIMEOUT,
+                 init_delay=INIT_DELAY, port_cache_path=DEFAULT_CACHE_PATH, trace_size=0, trace_path=None,
+                 retry_policy=None, auto_reconnect=True, raise_errors=False):
+        """
+        `retry_policy` (a RetryPolicy) controls resends of failed
+        transactions; `auto_reconnect` reopens a port that fails in the
+        background. With `raise_errors`, the typed API (start, set_pressure,
+        read_memory, ...) raises DispenserError subclasses instead of
+        returning False/None.
+        """
         self.logger = logging.getLogger('DispenserController')
-        
+
         self.ser = None
-        self.connect()
-        
-        # Keep track of the current mode (Timed or Steady)
-        self.is_timed_mode = True  # Assume starting in Timed Mode
+        # Whether this controller holds the claim on self.port
+        self._claimed = False
+        # Optional callable that wraps every port the controller opens, e.g.
+        # to keep a capture recording after a reconnect (nordson_capture.py)
+        self.port_wrapper = None
+        self.ack_timeout = ack_timeout
+        self.response_timeout = response_timeout
+        self.init_delay = init_delay
+
+        # Incremental decoder shared by every read in a transaction, plus any
+        # frames it completed that have not been consumed yet
+        self.decoder = FrameDecoder()
+        self._frames = deque()
+
+        # Keeps each ENQ ... EOT exchange atomic when several threads share
+        # the controller
+        self.lock = threading.Lock()
+
+        # Per-phase timings and error counters, cheap enough to leave enabled
+        self.metrics = TransactionMetrics()
+        self._metrics_command = None
+
+        # Setpoints, units and mode (Timed or Steady) as the device
+        # acknowledged them; used to skip writes that change nothing
+        self.shadow = DeviceShadow()
+
+        # Command code of the last A0/A2 response, None if there was none
+        self.last_response_code = None
+
+        # Failure handling: the DispenserError of the last failed
+        # transaction, resend policy and background reconnection
+        self.last_error = None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.raise_errors = raise_errors
+        self.auto_reconnect = auto_reconnect
+        self.reconnects = 0
+        self._reconnectable = False
+        self._reconnect_thread = None
+        self._reconnect_done = threading.Event()
+        self._closing = False
+        self._checksum_errors_start = 0
+
+        # Optional ring buffer of raw TX/RX bytes, dumped to trace_path
+        # whenever a transaction fails
+        self.trace = TraceBuffer(trace_size) if trace_size else None
+        self.trace_path = trace_path
+
+        # Ports where a dispenser was found before; None disables the cache
+        self.port_cache = PortCache(port_cache_path) if port_cache_path else None
+        self.port = None
+
+        self.connect(port)
         
         # Initialize start time variable
         self.start_time = None  # Will be set when a command is issued
         
         self.logger.info('Dispenser Controller Started')
     
-    def connect(self):
+    def connect(self, port=None):
+        """
+        Open `port` if given (e.g. '/dev/ttyUSB0' or an emulator pty).
+        Otherwise try the ports in the port cache first, each with a quick
+        ENQ/ACK liveness check, and fall back to scanning all serial ports.
+        `port` can also be an open serial-like object (e.g. a replay
+        transport), which is used as is.
+        """
+        # Port failures while connecting do not start a background reconnect
+        self._reconnectable = False
+        if port and not isinstance(port, str):
+            self.ser = port
+            self.port = getattr(port, 'port', None) or type(port).__name__
+            self.metrics.labels['port'] = self.port
+            return
+        if port:
+            if self._open_port(port):
+                if not self.wait_until_ready(self.init_delay):
+                    self.logger.warning(f"No ACK from {port}. The device may not be ready.")
+            else:
+                self.logger.error(f"Could not connect to {port}. Running in simulation mode.")
+            self._reconnectable = self.ser is not None
+            return
+
         available_ports = list(serial.tools.list_ports.comports())
         
         if not available_ports:
             self.logger.error("No serial ports found. Running in simulation mode.")
             return
 
+        if self.port_cache and self._connect_cached(available_ports):
+            self._reconnectable = True
+            return
+
         self.logger.info("Available serial ports:")
         for port in available_ports:
             self.logger.info(f"  {port.device}: {port.description}")
-        
+
+        self._discover(available_ports)
+        self._reconnectable = self.ser is not None
+
+    def _connect_cached(self, available_ports):
+        for device, entry in self.port_cache.candidates(available_ports):
+            if not self._open_port(device, entry.get('settings')):
+                continue
+            if self.wait_until_ready(LIVENESS_TIMEOUT):
+                self.logger.info(f'Using cached dispenser port {device}')
+                self._restore_state(entry.get('state', {}))
+                self._remember_port(available_ports, entry)
+                return True
+            self.logger.info(f'Cached port {device} did not answer.')
+            self._close_port()
+        return False
+
+    def _discover(self, available_ports):
+        first_opened = None
+        deadline = None
         for port in available_ports:
-            try:
-                self.ser = serial.Serial(
-                    port.device,
-                    baudrate=115200,  # Correct baud rate as per manual
-                    bytesize=serial.EIGHTBITS,  # 8 data bits (ASCII)
-                    parity=serial.PARITY_NONE,   # No parity
-                    stopbits=serial.STOPBITS_ONE,  # 1 stop bit
-                    timeout=0.0001
-                )
-                self.logger.info(f'Connected to {port.device}')
-                time.sleep(2)  # Wait for device to initialize
-                return
-            except serial.SerialException as e:
-                self.logger.error(f"Error connecting to {port.device}: {e}")
+            if not self._open_port(port.device):
                 continue
-        
-        if not self.ser:
+            if deadline is None:
+                # Allow the initialization time once; ports opened after it
+                # only get the regular probe
+                deadline = time.monotonic() + self.init_delay
+            if self.wait_until_ready(max(0.0, deadline - time.monotonic())):
+                self._remember_port(available_ports)
+                return
+            if first_opened is None:
+                first_opened = port.device
+            self._close_port()
+
+        if first_opened:
+            # Nothing answered the probe; keep the first port that opened
+            self.logger.warning(f"No device answered ENQ. Using {first_opened}.")
+            self._open_port(first_opened)
+        else:
             self.logger.error("Could not connect to any port. Running in simulation mode.")
 
+    def _create_port(self, device, settings=None, quiet=False):
+        """
+        Open `device` and return the serial port, or None if it cannot be
+        opened. The controller does not use it until _use_port().
+        """
+        port_settings = {
+            'baudrate': 115200,  # Correct baud rate as per manual
+            'bytesize': serial.EIGHTBITS,  # 8 data bits (ASCII)
+            'parity': serial.PARITY_NONE,   # No parity
+            'stopbits': serial.STOPBITS_ONE,  # 1 stop bit
+        }
+        if settings:
+            port_settings.update(settings)
+        try:
+            return serial.Serial(device, timeout=READ_POLL_INTERVAL, **port_settings)
+        except serial.SerialException as e:
+            if quiet:
+                self.logger.debug(f"Error connecting to {device}: {e}")
+            else:
+                self.logger.error(f"Error connecting to {device}: {e}")
+            return None
+
+    def _open_port(self, device, settings=None):
+        if not _claim_port(device):
+            # Probing it would send ENQ into the owner's transactions
+            self.logger.info(f'{device} is in use by another controller; not opening it')
+            return False
+        ser = self._create_port(device, settings)
+        if ser is None:
+            _release_port(device)
+            return False
+        self._use_port(device, ser)
+        return True
+
+    def _use_port(self, device, ser):
+        # Called with the claim on `device` taken
+        self._claimed = True
+        self.ser = self.port_wrapper(ser) if self.port_wrapper else ser
+        self.logger.info(f'Connected to {device}')
+        self.port = device
+        self.metrics.labels['port'] = device
+
+    def _close_port(self):
+        if self.ser:
+            self.ser.close()
+        self._release_claim()
+        self.ser = None
+        self.port = None
+
+    def _release_claim(self):
+        # Only the controller that claimed its port gives the claim up
+        if self._claimed:
+            _release_port(self.port)
+            self._claimed = False
+
+    def _remember_port(self, available_ports, entry=None):
+        if not self.port_cache:
+            return
+        for port_info in available_ports:
+            if port_info.device == self.port:
+                self.port_cache.remember(port_info, self.ser.get_settings(), entry)
+                self._save_state()
+                return
+
+    @property
+    def is_timed_mode(self):
+        return self.shadow.timed_mode
+
+    @property
+    def pressure_units(self):
+        return self.shadow.pressure_units
+
+    @property
+    def vacuum_units(self):
+        return self.shadow.vacuum_units
+
+    def _restore_state(self, state):
+        # Cached state is informative only until the device confirms it
+        self.shadow.restore(**{name: state[name] for name in ('timed_mode', 'pressure_units', 'vacuum_units')
+                               if state.get(name) is not None})
+
+    def _save_state(self):
+        # Last known device state, restored when the cached port is reused
+        if self.port_cache and self.port:
+            self.port_cache.update_state(
+                self.port,
+                timed_mode=self.is_timed_mode,
+                pressure_units=self.pressure_units,
+                vacuum_units=self.vacuum_units,
+            )
+
     def run(self):
         try:
             while True:
@@ -58,7 +353,7 @@ class DispenserController:
                 if command_str.lower() == 'exit':
                     break
                 # Record the start time when the user presses Enter
-                self.start_time = time.time()
+                self.start_time = time.monotonic()
                 self.dispenser_callback(command_str)
         except KeyboardInterrupt:
             pass
@@ -74,212 +369,563 @@ class DispenserController:
         checksum = (0 - sum(data_str.encode('ascii'))) & 0xFF
         return checksum
 
+    def _read_bytes(self, size, timeout):
+        """
+        Read exactly `size` bytes, returning as soon as they have arrived.
+        If the deadline passes first, whatever was received is returned.
+        """
+        deadline = time.monotonic() + timeout
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.ser.read(size - len(data))
+            if chunk:
+                if self.trace is not None:
+                    self.trace.rx(chunk)
+                data += chunk
+            elif time.monotonic() >= deadline:
+                break
+        return bytes(data)
+
+    def _read_frame(self, timeout):
+        """
+        Return the payload (command + data bytes) of the next complete,
+        checksum-verified frame, or None if none arrives before the deadline.
+        """
+        if self._frames:
+            return self._frames.popleft()
+        deadline = time.monotonic() + timeout
+        while True:
+            chunk = self.ser.read(max(1, self.ser.in_waiting))
+            if chunk:
+                if self.trace is not None:
+                    self.trace.rx(chunk)
+                self._frames.extend(self.decoder.feed(chunk))
+                if self._frames:
+                    return self._frames.popleft()
+            elif time.monotonic() >= deadline:
+                if self.decoder.buffered:
+                    self.logger.warning(f"Incomplete frame after {timeout * 1000:.0f} ms ({self.decoder.buffered} bytes buffered).")
+                return None
+
+    def build_packet(self, command_code, data):
+        """
+        Build the STX...ETX packet for a command code and its data string.
+        Packets are cached, so repeated commands are only encoded once.
+        """
+        return encode_command(command_code, data if data else '')
+
     def send_command(self, command_code, data, expect_response=False):
-        if self.ser:
+        return self.send_packet(self.build_packet(command_code, data), expect_response)
+
+    def send_packet(self, packet, expect_response=False):
+        """
+        Run one ENQ ... EOT transaction for an already encoded packet,
+        retried according to retry_policy.
+
+        Returns the data string for a successful read, True for a successful
+        write and None if the command failed or the device did not answer.
+        The reason for a None is kept in last_error.
+        """
+        try:
+            return self.transact(packet, expect_response)
+        except DispenserError:
+            return None
+
+    def transact(self, packet, expect_response=False, retry_policy=None):
+        """
+        Like send_packet(), but raises the DispenserError subclass of the
+        last failure (NoAck, DispenserTimeout, ChecksumError, CommandFailed
+        or Disconnected) once the retries are used up.
+        """
+        policy = retry_policy or self.retry_policy
+        attempt = 0
+        while True:
+            attempt += 1
+            self._wait_for_reconnect(policy.reconnect_wait)
             try:
-                # Send ENQ (0x05) before each command
-                self.ser.write(b'\x05')
+                with self.lock:
+                    result = self._send_packet(packet, expect_response)
+            except DispenserError as e:
+                self.last_error = e
+                if not policy.should_retry(e, attempt, packet) or \
+                        (isinstance(e, Disconnected) and not self._reconnecting()):
+                    if self.trace_path and self.trace is not None:
+                        self.dump_trace()
+                    raise
+                self.metrics.increment(e.command, 'retry')
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info(f'Retrying {e.command} after {type(e).__name__} (attempt {attempt + 1}/{policy.attempts})')
+                if not isinstance(e, Disconnected):
+                    time.sleep(policy.delay(attempt))
+                continue
+            self.last_error = None
+            return result
+
+    def _write_bytes(self, data):
+        self.ser.write(data)
+        if self.trace is not None:
+            self.trace.tx(data)
+
+    def dump_trace(self, path=None):
+        """
+        Write the TX/RX trace buffer to `path` (default: trace_path).
+        Decode the file with `python nordson_trace.py <file>`.
+        """
+        path = path or self.trace_path
+        if self.trace is None or not path:
+            self.logger.warning('Tracing is not enabled; nothing to dump.')
+            return
+        try:
+            self.trace.dump(path)
+        except OSError as e:
+            self.logger.error(f'Could not write trace {path}: {e}')
+
+    def _send_packet(self, packet, expect_response):
+        self.last_response_code = None
+        # Command code as used in the metrics, e.g. 'PS' or 'E8'
+        command = packet[3:5].decode('ascii')
+        if not self.ser:
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(f'Simulated command sent.')
+                self.logger.info('Simulated successful response')
+            raise Disconnected('No serial port is open', command)
+        self._metrics_command = command
+        checksum_errors = self._checksum_errors_start = self.decoder.checksum_errors
+        transaction_start = time.monotonic_ns()
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        try:
+            # Discard stale bytes, e.g. a late reply to a timed-out transaction
+            self.ser.reset_input_buffer()
+            self.decoder.reset()
+            self._frames.clear()
+
+            # Send ENQ (0x05) before each command
+            self._write_bytes(ENQ)
+            phase_start = time.monotonic_ns()
+            if debug:
                 self.logger.debug('Sent ENQ (0x05)')
-                time.sleep(0.1)  # Wait a bit for the device to respond
 
-                # Wait for ACK (0x06)
-                ack_response = self.ser.read(1)
-                if ack_response != b'\x06':
-                    self.logger.warning("Did not receive ACK after ENQ. Communication may not be established.")
-                    return
+            # Wait for ACK (0x06)
+            ack_response = self._read_bytes(1, self.ack_timeout)
+            if ack_response != ACK:
+                self.metrics.increment(command, 'missing_ack')
+                if not ack_response:
+                    self.logger.warning(f"Timed out after {self.ack_timeout * 1000:.0f} ms waiting for ACK after ENQ. Communication may not be established.")
+                    raise NoAck(f'No ACK within {self.ack_timeout * 1000:.0f} ms', command)
+                self.logger.warning(f"Did not receive ACK after ENQ (got {ack_response.hex()}). Communication may not be established.")
+                self._resync()
+                raise NoAck(f'Expected ACK, got {ack_response.hex()}', command)
+            self.metrics.record_phase(command, 'enq_ack', time.monotonic_ns() - phase_start)
+            if debug:
                 self.logger.debug('Received ACK after ENQ')
-
-                # Proceed to send the command packet
-                STX = b'\x02'  # Start of Text as a single byte
-                ETX = b'\x03'  # End of Text as a single byte
-
-                # Convert command code and data to strings
-                command_str = command_code  # Ensure command_code has spaces instead of hyphens
-                data_str = data if data else ''
-
-                # Correct Length: total number of characters in Command and Data
-                length = len(command_str) + len(data_str)
-                length_hex = f"{length:02X}"  # Zero-padded two-digit hexadecimal
-                length_str = length_hex  # This is already ASCII representation
-
-                # Data for checksum calculation
-                checksum_input_str = length_str + command_str + data_str
-                checksum_value = self.calculate_checksum_ascii(checksum_input_str)
-                checksum_str = f"{checksum_value:02X}"  # Uppercase hexadecimal, two digits
-
-                # Construct the full packet
-                packet = (
-                    STX +
-                    length_str.encode('ascii') +
-                    command_str.encode('ascii') +
-                    data_str.encode('ascii') +
-                    checksum_str.encode('ascii') +
-                    ETX
-                )
-
-                # For debugging, print the packet being sent
                 self.logger.debug(f'Sent packet: {packet.hex()}')
 
-                # Send the command packet
-                self.ser.write(packet)
-                time.sleep(0.1)  # Wait for device to process
+            # Send the command packet
+            self._write_bytes(packet)
+            phase_start = time.monotonic_ns()
 
-                # Wait for response from the dispenser
-                response = self.ser.read(100)  # Read up to 100 bytes
-                if response:
-                    return self.check_response(response, expect_response)
-                else:
-                    self.logger.warning("No response from device after sending command. Command may not have been executed.")
-            except serial.SerialException as e:
-                self.logger.error(f"Error communicating with device: {e}")
-        else:
-            self.logger.info(f'Simulated command sent.')
-            self.logger.info('Simulated successful response')
+            # Wait for the A0/A2 response frame from the dispenser
+            response = self._read_frame(self.response_timeout)
+            if response is None:
+                self.metrics.increment(command, 'timeout')
+                self.logger.warning(f"Timed out after {self.response_timeout * 1000:.0f} ms waiting for response. Command may not have been executed.")
+                # Close the sequence so the device is ready for the next ENQ
+                self._write_bytes(EOT)
+                self._resync()
+                raise self._timeout_error('response', command)
+            self.metrics.record_phase(command, 'packet_response', time.monotonic_ns() - phase_start)
+            return self.check_response(response, expect_response)
+        except DispenserError:
+            raise
+        except PORT_ERRORS as e:
+            self.metrics.increment(command, 'serial_error')
+            self.logger.error(f"Error communicating with device: {e}")
+            self._handle_disconnect()
+            raise Disconnected(f'Serial port failed: {e}', command) from e
+        finally:
+            self._record_transaction(command, transaction_start, checksum_errors)
+
+    def _timeout_error(self, what, command):
+        if self.decoder.checksum_errors > self._checksum_errors_start:
+            return ChecksumError(f'Only frames with bad checksums received while waiting for the {what}', command)
+        return DispenserTimeout(f'No {what} within {self.response_timeout * 1000:.0f} ms', command)
+
+    def _resync(self):
+        """
+        Drain what the device is still sending after a failed exchange (e.g.
+        a late reply) until the line is quiet for one read, so the next
+        transaction starts clean. The decoder skips any partial frame up to
+        the next STX.
+        """
+        deadline = time.monotonic() + self.response_timeout
+        while time.monotonic() < deadline:
+            chunk = self.ser.read(max(1, self.ser.in_waiting))
+            if not chunk:
+                break
+            if self.trace is not None:
+                self.trace.rx(chunk)
+        self.decoder.reset()
+        self._frames.clear()
+
+    def _handle_disconnect(self):
+        # Called with the lock held after the port failed
+        device = self.port
+        settings = None
+        try:
+            settings = {name: value for name, value in self.ser.get_settings().items() if name in CACHED_SETTINGS}
+            self.ser.close()
+        except Exception:
+            pass
+        self.ser = None
+        self._release_claim()
+        if self.auto_reconnect and self._reconnectable and device and not self._closing:
+            # Identity of the lost adapter, to recognize it under another name
+            entry = self.port_cache.lookup(device) if self.port_cache else None
+            self._start_reconnect(device, settings, entry)
+
+    def _start_reconnect(self, device, settings, entry):
+        if self._reconnect_thread is not None and self._reconnect_thread.is_alive():
+            return
+        self._reconnect_done.clear()
+        self._reconnect_thread = threading.Thread(target=self._reconnect, args=(device, settings, entry),
+                                                  name='DispenserReconnect', daemon=True)
+        self._reconnect_thread.start()
+
+    def _reconnect_candidates(self, device, entry):
+        """
+        Devices that can only be the lost dispenser: ports with the USB
+        serial number (or unique VID/PID) of its cache entry, which also
+        finds an adapter that came back under another name. Without a USB
+        identity, only the same device path.
+        """
+        if entry is not None:
+            candidates = self.port_cache.same_adapter(entry, serial.tools.list_ports.comports())
+            if candidates is not None:
+                # The same path first, as long as it is still the same adapter
+                return sorted(candidates, key=lambda candidate: candidate != device)
+        return [device]
+
+    def _reconnect(self, device, settings, entry):
+        """
+        Reopen a dropped port in the background. Each candidate is opened
+        and given the short liveness check on its own; the controller only
+        switches to it, under the lock, once it answered.
+        """
+        started = time.monotonic()
+        delay = RECONNECT_MIN_DELAY
+        self.logger.warning(f'Lost {device}; reconnecting in the background')
+        try:
+            while not self._closing:
+                for candidate in self._reconnect_candidates(device, entry):
+                    if self._try_reconnect(candidate, settings):
+                        self.reconnects += 1
+                        self.logger.warning(f'Reconnected to {candidate} after {time.monotonic() - started:.2f} s')
+                        return
+                time.sleep(random.uniform(delay / 2, delay))
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        finally:
+            self._reconnect_done.set()
+
+    def _try_reconnect(self, device, settings):
+        if not _claim_port(device):
+            # Another controller in this process owns it
+            return False
+        ser = self._create_port(device, settings, quiet=True)
+        if ser is not None and self._port_answers(ser, LIVENESS_TIMEOUT):
+            with self.lock:
+                if not self._closing:
+                    self._use_port(device, ser)
+                    # The device may have been power cycled
+                    self.shadow.invalidate()
+                    return True
+        if ser is not None:
+            ser.close()
+        _release_port(device)
+        return False
+
+    def _port_answers(self, ser, timeout):
+        """
+        Liveness check of a port the controller does not use yet: the
+        ENQ/ACK/EOT of probe(), repeated until it answers or `timeout`
+        seconds pass. A failing port counts as not answering.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                ser.reset_input_buffer()
+                ser.write(ENQ)
+                answer = b''
+                answer_deadline = time.monotonic() + self.ack_timeout
+                while not answer and time.monotonic() < answer_deadline:
+                    answer = ser.read(1)
+                ser.write(EOT)
+                if answer == ACK:
+                    return True
+                if time.monotonic() >= deadline:
+                    return False
+        except PORT_ERRORS as e:
+            self.logger.debug(f'Error probing reconnected port: {e}')
+            return False
+
+    def _reconnecting(self):
+        return self._reconnect_thread is not None and self._reconnect_thread.is_alive()
+
+    def _wait_for_reconnect(self, timeout):
+        if self._reconnecting():
+            self._reconnect_done.wait(timeout)
+
+    def probe(self, timeout=None):
+        """
+        Check that an Ultimus V answers on the open port: send ENQ, expect
+        ACK, then end the sequence with EOT. Returns True if it answered.
+        """
+        with self.lock:
+            if not self.ser:
+                return False
+            try:
+                self.ser.reset_input_buffer()
+                self._write_bytes(ENQ)
+                answered = self._read_bytes(1, timeout or self.ack_timeout) == ACK
+                self._write_bytes(EOT)
+            except PORT_ERRORS as e:
+                self.logger.error(f"Error probing device: {e}")
+                self._handle_disconnect()
+                return False
+        return answered
+
+    def wait_until_ready(self, timeout):
+        """
+        Probe repeatedly until the device answers or `timeout` seconds pass.
+        Returns as soon as the device is ready, instead of a fixed wait.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.probe():
+                return True
+            if not self.ser or time.monotonic() >= deadline:
+                return False
+
+    def _record_transaction(self, command, transaction_start, checksum_errors):
+        metrics = self.metrics
+        metrics.record_phase(command, 'total', time.monotonic_ns() - transaction_start)
+        metrics.count_transaction(command)
+        checksum_mismatches = self.decoder.checksum_errors - checksum_errors
+        if checksum_mismatches:
+            metrics.increment(command, 'checksum_mismatch', checksum_mismatches)
+        self._metrics_command = None
+
+    def export_metrics(self, path):
+        """
+        Write the transaction metrics to `path`: Prometheus text format for a
+        '.prom' file, a JSON snapshot otherwise.
+        """
+        self.metrics.export(path)
+        self.logger.info(f'Metrics written to {path}')
+
+    def start(self):
+        """
+        Start dispensing (DI). Returns True if the device acknowledged it.
+        """
+        return bool(self._execute('start'))
+
+    def stop(self):
+        """
+        Stop dispensing. The device toggles steady-mode dispensing with DI.
+        """
+        return bool(self._execute('stop'))
+
+    def toggle_mode(self):
+        """
+        Toggle between timed and steady mode (TM). The tracked mode only
+        changes when the device acknowledges the command.
+        """
+        result = self._write('toggle_mode', force=True)
+        if result:
+            self.logger.info('Switched to Timed Mode' if self.is_timed_mode else 'Switched to Steady Mode')
+        return result
+
+    def set_mode(self, timed, force=False):
+        """
+        Switch to timed (True) or steady (False) mode, sending TM only if
+        the confirmed mode differs.
+        """
+        if not force and self.shadow.is_confirmed('timed_mode') and self.shadow.timed_mode == timed:
+            self.shadow.skipped_writes += 1
+            return True
+        if not self.shadow.is_confirmed('timed_mode'):
+            self.logger.warning('Mode not confirmed by the device yet; assuming '
+                                f"{'Timed' if self.is_timed_mode else 'Steady'} Mode.")
+        if self.is_timed_mode == timed:
+            return True
+        return self.toggle_mode()
+
+    def set_pressure(self, psi, force=False):
+        """
+        Set the dispense pressure (PS), 0.0 - 100.0 psi.
+        Raises ValueError if the value is out of range.
+        """
+        return self._write('pressure', psi, force)
+
+    def set_vacuum(self, inches_h2o, force=False):
+        """
+        Set the vacuum level (VS), 0.0 - 18.0 inH2O.
+        Raises ValueError if the value is out of range.
+        """
+        return self._write('vacuum', inches_h2o, force)
+
+    def set_time(self, seconds, force=False):
+        """
+        Set the dispense time (DS), 0.0000 - 9.9999 seconds.
+        Raises ValueError if the value is out of range.
+        """
+        return self._write('time', seconds, force)
+
+    def set_pressure_units(self, unit, force=False):
+        """
+        Set the pressure units (E6): 'psi', 'bar' or 'kpa'.
+        """
+        return self._write('pressure_units', unit, force)
+
+    def set_vacuum_units(self, unit, force=False):
+        """
+        Set the vacuum units (E7): 'kpa', 'inches_h2o', 'inches_hg', 'mmhg' or 'torr'.
+        """
+        return self._write('vacuum_units', unit, force)
+
+    def select_memory(self, memory_location, force=False):
+        """
+        Make a memory location (CH), 0 - 399, the one PS/DS/VS write to.
+        """
+        return self._write('memory_location', memory_location, force)
+
+    def read_memory(self, memory_location=0):
+        """
+        Read pressure, time and vacuum from a memory location (E8), 0 - 399.
+        Returns MemoryValues, or None if the read failed.
+        """
+        response_data = self._execute('read_values', memory_location)
+        if response_data:
+            values = self.parse_read_values(response_data)
+            if values and self.shadow.is_confirmed('memory_location') \
+                    and self.shadow.memory_location == memory_location:
+                self.shadow.observe(values)
+            return values
         return None
 
+    def sync_shadow(self, memory_location=None):
+        """
+        Re-read the setpoints of the active memory location into the shadow.
+        Pass `memory_location` when the shadow does not know it yet, e.g.
+        right after connecting; it is then taken as the active location.
+        Without either, location 0 is assumed, as for read_values.
+        Returns MemoryValues, or None if the read failed.
+        """
+        if memory_location is None:
+            memory_location = self.shadow.memory_location or 0
+        response_data = self._execute('read_values', memory_location)
+        values = self.parse_read_values(response_data) if response_data else None
+        if values:
+            self.shadow.apply('memory_location', memory_location)
+            self.shadow.observe(values)
+        return values
+
+    def _write(self, name, value=None, force=False):
+        """
+        Send a write command unless the shadow shows the device already has
+        `value`. The shadow is updated only when the device answers A0.
+        """
+        if not force and self.shadow.is_current(name, value):
+            self.shadow.skipped_writes += 1
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f'Skipping {name} {value}: already set on the device')
+            return True
+        try:
+            result = bool(self._execute(name, value))
+        except DispenserError:
+            self._forget_write(name)
+            raise
+        if result:
+            self.shadow.apply(name, value)
+            if name in ('toggle_mode', 'pressure_units', 'vacuum_units'):
+                self._save_state()
+        else:
+            self._forget_write(name)
+        return result
+
+    def _forget_write(self, name):
+        if self.last_response_code == b'A2':
+            # Rejected: the device state did not change
+            return
+        # No answer: the device may or may not have applied the write
+        if name == 'toggle_mode':
+            self.shadow.invalidate('timed_mode')
+        elif name == 'memory_location':
+            self.shadow.invalidate(name, *SETPOINTS)
+        else:
+            self.shadow.invalidate(name)
+
+    def _execute(self, name, value=None):
+        # Validation happens while encoding, before anything is sent
+        packet = encode(name, value)
+        result = self.send_packet(packet, COMMANDS[name].expect_response)
+        if result is None and self.raise_errors and self.last_error is not None:
+            raise self.last_error
+        return result
+
     def dispenser_callback(self, command_str):
-        if command_str == 'start':
-            # RS-232 command to start dispensing (DI  )
-            self.send_command('DI  ', '')
-        elif command_str == 'stop':
-            # RS-232 command to stop dispensing (DO  )
-            self.send_command('DI  ', '')
-        elif command_str.startswith('pressure '):
-            try:
-                pressure_value = float(command_str.split(' ')[1])
-                if 0.0 <= pressure_value <= 100.0:
-                    formatted_pressure = f"{int(pressure_value * 10):04d}"
-                    self.send_command('PS  ', formatted_pressure)
-                else:
-                    self.logger.error(f'Invalid pressure value: {pressure_value}. Must be between 0.0 and 100.0 psi')
-            except (IndexError, ValueError):
-                self.logger.error('Invalid pressure command format. Use: pressure <value>')
-        elif command_str.startswith('vacuum '):
-            try:
-                vacuum_value = float(command_str.split(' ')[1])
-                if 0.0 <= vacuum_value <= 18.0:
-                    formatted_vacuum = f"{int(vacuum_value * 10):04d}"
-                    self.send_command('VS  ', formatted_vacuum)
-                else:
-                    self.logger.error(f'Invalid vacuum value: {vacuum_value}. Must be between 0.0 and 18.0 inH2O')
-            except (IndexError, ValueError):
-                self.logger.error('Invalid vacuum command format. Use: vacuum <value>')
-        elif command_str == 'toggle_mode':
-            # RS-232 command to toggle between timed and steady mode (TM  )
-            self.send_command('TM  ', '')
-            
-            if self.is_timed_mode:
-                self.is_timed_mode = False
-                self.logger.info('Switched to Steady Mode')
+        """
+        Run a command line such as 'pressure 12.5' through the typed API.
+        Returns the API call's result, or None for invalid commands.
+        """
+        parts = command_str.split()
+        if parts and parts[0] in ('metrics', 'trace') and len(parts) <= 2:
+            path = parts[1] if len(parts) == 2 else None
+            if parts[0] == 'trace':
+                # Dump the raw TX/RX trace buffer
+                self.dump_trace(path)
+            elif path:
+                # Export to a file (.prom for Prometheus)
+                self.export_metrics(path)
             else:
-                self.is_timed_mode = True
-                self.logger.info('Switched to Timed Mode')
-        elif command_str.startswith('time '):
-            # Set Dispense Time Command
-            try:
-                time_value = float(command_str.split(' ')[1])
-                if 0.0000 <= time_value <= 9.9999:
-                    # Remove decimal point and format as per the manual
-                    if time_value < 1.0000:
-                        formatted_time = f"T{int(time_value * 10000):04d}"
-                    else:
-                        formatted_time = f"T{int(time_value * 10000):05d}"
-                    self.send_command('DS  ', formatted_time)
-                else:
-                    self.logger.error(f'Invalid time value: {time_value}. Must be between 0.0000 and 9.9999 seconds')
-            except (IndexError, ValueError):
-                self.logger.error('Invalid time command format. Use: time <value>')
-        elif command_str.startswith('read_values'):
-            # Read Pressure, Time, and Vacuum Command
-            try:
-                parts = command_str.split(' ')
-                if len(parts) == 2:
-                    memory_location = int(parts[1])
-                else:
-                    memory_location = 0  # Default to memory location 0 if not specified
-                if 0 <= memory_location <= 399:
-                    memory_location_str = f"{memory_location:03d}"
-                    response_data = self.send_command('E8', memory_location_str, expect_response=True)
-                    if response_data:
-                        self.parse_read_values(response_data)
-                else:
-                    self.logger.error(f'Invalid memory location: {memory_location}. Must be between 0 and 399')
-            except ValueError:
-                self.logger.error('Invalid memory location format. Use: read_values <memory_location>')
-        elif command_str.startswith('set_pressure_units '):
-            units_map = {'psi': '00', 'bar': '01', 'kpa': '02'}
-            try:
-                unit = command_str.split(' ')[1].lower()
-                if unit in units_map:
-                    units_code = units_map[unit]
-                    self.send_command('E6  ', units_code)
-                else:
-                    self.logger.error(f'Invalid pressure unit: {unit}. Must be one of {list(units_map.keys())}')
-            except IndexError:
-                self.logger.error('Invalid command format. Use: set_pressure_units <unit>')
-        elif command_str.startswith('set_vacuum_units '):
-            units_map = {'kpa': '00', 'inches_h2o': '01', 'inches_hg': '02', 'mmhg': '03', 'torr': '04'}
-            try:
-                unit = command_str.split(' ')[1].lower()
-                if unit in units_map:
-                    units_code = units_map[unit]
-                    self.send_command('E7  ', units_code)
-                else:
-                    self.logger.error(f'Invalid vacuum unit: {unit}. Must be one of {list(units_map.keys())}')
-            except IndexError:
-                self.logger.error('Invalid command format. Use: set_vacuum_units <unit>')
-        else:
-            self.logger.error(f'Unknown command: {command_str}')
-    
+                self.logger.info(json.dumps(self.metrics.snapshot(), indent=2))
+            return None
+        try:
+            method, args = parse_command(command_str)
+            result = getattr(self, method)(*args)
+        except ValueError as e:
+            # Unknown commands, malformed lines and out-of-range values
+            self.logger.error(str(e))
+            return None
+        if method == 'sync_shadow':
+            self.logger.info(f'Device state: {self.shadow.as_dict()}')
+        return result
+
     def parse_read_values(self, data_str):
         """
         Parses the data received from the E8 command and displays the pressure, time, and vacuum values.
+        Returns MemoryValues, or None if the data has an unexpected format.
         """
         # Expected format: D0PDppppDTtttttVCvvvv
         try:
-            if data_str.startswith('D0'):
-                index = 2
-                # Parse Pressure
-                if data_str[index:index+2] == 'PD':
-                    index += 2
-                    pressure_value = data_str[index:index+4]
-                    index += 4
-                    # Convert pressure_value to float
-                    pressure = int(pressure_value) / 10.0  # Assuming pressure unit is psi
-                    # Parse Time
-                    if data_str[index:index+2] == 'DT':
-                        index += 2
-                        time_value = data_str[index:index+5]
-                        index += 5
-                        # Convert time_value to float
-                        time_sec = int(time_value) / 10000.0
-                        # Parse Vacuum
-                        if data_str[index:index+2] == 'VC':
-                            index += 2
-                            vacuum_value = data_str[index:index+4]
-                            index += 4
-                            # Convert vacuum_value to float
-                            vacuum = int(vacuum_value) / 10.0  # Assuming vacuum unit is H2O
-                            # Display the values
-                            self.logger.info(f"Pressure: {pressure} psi")
-                            self.logger.info(f"Time: {time_sec} seconds")
-                            self.logger.info(f"Vacuum: {vacuum} H2O")
-                        else:
-                            self.logger.error("Invalid response format: Missing 'VC'")
-                    else:
-                        self.logger.error("Invalid response format: Missing 'DT'")
-                else:
-                    self.logger.error("Invalid response format: Missing 'PD'")
-            else:
-                self.logger.error("Invalid response format: Missing 'D0'")
-        except Exception as e:
+            values = parse_memory_values(data_str)
+        except ValueError as e:
             self.logger.error(f"Error parsing response: {e}")
-    
+            return None
+        # Display the values
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(f"Pressure: {values.pressure} psi")
+            self.logger.info(f"Time: {values.time} seconds")
+            self.logger.info(f"Vacuum: {values.vacuum} H2O")
+        return values
+
     def check_response(self, response, expect_response=False):
         """
         Handle the response from the dispenser according to the protocol.
 
-        - Parse and process all messages in the response buffer.
+        `response` is the payload of a decoded frame (command + data bytes).
+        Returns the data string for a read and True for a successful write.
+        Raises CommandFailed for A2 or an unexpected response, and
+        DispenserTimeout or ChecksumError if the data frame does not arrive.
         - If the response is a Success Command (A0):
             - For Read commands (expect_response=True):
                 - Send ACK (0x06) to indicate readiness to receive data
@@ -289,186 +935,113 @@ class DispenserController:
             - For Write commands (expect_response=False):
                 - Send EOT (0x04) to end the sequence
         - If the response is a Failure Command (A2):
-            - Send EOT (0x04) to end the sequence.
-        """
-        self.logger.debug(f'Received raw response: {response.hex()}')
-
-        # Process response byte by byte
-        index = 0
-        while index < len(response):
-            if response[index] == 0x02:  # STX
-                # Start of a message
-                index += 1
-                # Read length (2 ASCII characters)
-                if index + 1 >= len(response):
-                    self.logger.warning("Incomplete length in response.")
-                    break
-                length_str = response[index:index+2].decode('ascii', errors='ignore')
-                index += 2
-                try:
-                    length = int(length_str, 16)
-                except ValueError:
-                    self.logger.warning("Invalid length in response.")
-                    break
-
-                # Read command and data (length bytes)
-                if index + length + 2 > len(response):
-                    self.logger.warning("Incomplete command/data in response.")
-                    break
-                command_and_data = response[index:index+length].decode('ascii', errors='ignore')
-                index += length
+            - Send EOT (0x04) to end the sequence and raise CommandFailed.
+        """
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        info = self.logger.isEnabledFor(logging.INFO)
+        if debug:
+            self.logger.debug(f'Received response: {response}')
 
-                # Read checksum (2 ASCII characters)
-                checksum_str = response[index:index+2].decode('ascii', errors='ignore')
-                index += 2
+        # Get command code
+        command_code = response[:2]
+        self.last_response_code = command_code
 
-                # Read ETX
-                if index >= len(response) or response[index] != 0x03:
-                    self.logger.warning("Missing ETX in response.")
-                    break
-                index += 1  # Skip ETX
-
-                # Verify checksum
-                checksum_input_str = length_str + command_and_data
-                calculated_checksum = self.calculate_checksum_ascii(checksum_input_str)
-                try:
-                    received_checksum = int(checksum_str, 16)
-                except ValueError:
-                    self.logger.warning("Invalid checksum in response.")
-                    continue
-
-                if received_checksum != calculated_checksum:
-                    self.logger.warning("Checksum mismatch in response.")
-                    continue
-
-                # Get command code
-                command_code = command_and_data[:2]
-
-                # Handle Success Command (A0) or Failure Command (A2)
-                if command_code == 'A0':
-                    # Record the end time
-                    end_time = time.time()
-                    # Calculate the delay in milliseconds
-                    if self.start_time:
-                        delay = (end_time - self.start_time) * 1000  # Convert to milliseconds
-                        self.logger.info(f'Delay time: {delay:.2f} milliseconds')
-                    else:
-                        self.logger.warning('Start time not recorded. Cannot calculate delay.')
-
-                    self.logger.info('Received Success Command (A0).')
-                    if expect_response:
-                        # For Read commands
-                        self.logger.debug('Sending ACK (0x06) to receive data.')
-                        self.ser.write(b'\x06')  # Send ACK
-                        time.sleep(0.1)
-                        # Wait for data response
-                        data_response = self.ser.read(100)
-                        if data_response:
-                            self.logger.debug(f'Received data response: {data_response.hex()}')
-                            # Process data response
-                            data_str = self.process_data_response(data_response)
-                            # After processing data, send EOT to end the sequence
-                            self.logger.debug('Sending EOT (0x04) to end the sequence.')
-                            self.ser.write(b'\x04')
-                            time.sleep(0.1)
-                            return data_str
-                        else:
-                            self.logger.warning("No data response received.")
-                            # Send EOT to end the sequence
-                            self.logger.debug('Sending EOT (0x04) to end the sequence.')
-                            self.ser.write(b'\x04')
-                            time.sleep(0.1)
-                    else:
-                        # For Write commands
+        # Handle Success Command (A0) or Failure Command (A2)
+        if command_code == b'A0':
+            if info:
+                self._log_delay()
+                self.logger.info('Received Success Command (A0).')
+            if expect_response:
+                # For Read commands
+                if debug:
+                    self.logger.debug('Sending ACK (0x06) to receive data.')
+                self._write_bytes(ACK)  # Send ACK
+                phase_start = time.monotonic_ns()
+                # Wait for data response
+                data_response = self._read_frame(self.response_timeout)
+                if data_response is not None:
+                    data_received = time.monotonic_ns()
+                    self.metrics.record_phase(self._metrics_command, 'ack_data', data_received - phase_start)
+                    # Process data response
+                    data_str = self.process_data_response(data_response)
+                    # After processing data, send EOT to end the sequence
+                    if debug:
                         self.logger.debug('Sending EOT (0x04) to end the sequence.')
-                        self.ser.write(b'\x04')  # Send EOT
-                        time.sleep(0.1)
-                elif command_code == 'A2':
-                    # Record the end time
-                    end_time = time.time()
-                    # Calculate the delay in milliseconds
-                    if self.start_time:
-                        delay = (end_time - self.start_time) * 1000  # Convert to milliseconds
-                        self.logger.info(f'Delay time: {delay:.2f} milliseconds')
-                    else:
-                        self.logger.warning('Start time not recorded. Cannot calculate delay.')
-
-                    self.logger.info('Received Failure Command (A2). Sending EOT to end the sequence.')
-                    self.ser.write(b'\x04')  # Send EOT
-                    time.sleep(0.1)
+                    self._write_bytes(EOT)
+                    self.metrics.record_phase(self._metrics_command, 'data_eot', time.monotonic_ns() - data_received)
+                    return data_str
                 else:
-                    self.logger.info(f'Received response with command code {command_code}: {command_and_data}')
+                    self.metrics.increment(self._metrics_command, 'timeout')
+                    self.logger.warning(f"Timed out after {self.response_timeout * 1000:.0f} ms waiting for data response.")
+                    # Send EOT to end the sequence
+                    if debug:
+                        self.logger.debug('Sending EOT (0x04) to end the sequence.')
+                    self._write_bytes(EOT)
+                    self._resync()
+                    raise self._timeout_error('data response', self._metrics_command)
             else:
-                # Unexpected byte, skip
-                index += 1
-        return None
+                # For Write commands
+                if debug:
+                    self.logger.debug('Sending EOT (0x04) to end the sequence.')
+                self._write_bytes(EOT)  # Send EOT
+                return True
+        elif command_code == b'A2':
+            self.metrics.increment(self._metrics_command, 'a2_failure')
+            if info:
+                self._log_delay()
+                self.logger.info('Received Failure Command (A2). Sending EOT to end the sequence.')
+            self._write_bytes(EOT)  # Send EOT
+            raise CommandFailed('Device answered A2 (failure)', self._metrics_command)
+        if info:
+            self.logger.info(f'Received response with command code {command_code}: {response}')
+        self._write_bytes(EOT)
+        raise CommandFailed(f'Unexpected response {response!r}', self._metrics_command)
+
+    def _log_delay(self):
+        # Delay since the command was entered on the command line
+        if self.start_time:
+            delay = (time.monotonic() - self.start_time) * 1000  # Convert to milliseconds
+            self.logger.info(f'Delay time: {delay:.2f} milliseconds')
+        else:
+            # Not issued from the command line; see self.metrics for timings
+            self.logger.debug('Start time not recorded. Cannot calculate delay.')
 
     def process_data_response(self, response):
         """
         Processes the data response received after sending ACK for a read command.
+        `response` is the payload of a decoded frame; it is returned as a string.
         """
-        self.logger.debug(f'Processing data response: {response.hex()}')
-        index = 0
-        while index < len(response):
-            if response[index] == 0x02:  # STX
-                index += 1
-                # Read length (2 ASCII characters)
-                if index + 1 >= len(response):
-                    self.logger.warning("Incomplete length in data response.")
-                    break
-                length_str = response[index:index+2].decode('ascii', errors='ignore')
-                index += 2
-                try:
-                    length = int(length_str, 16)
-                except ValueError:
-                    self.logger.warning("Invalid length in data response.")
-                    break
-
-                # Read command and data (length bytes)
-                if index + length + 2 > len(response):
-                    self.logger.warning("Incomplete command/data in data response.")
-                    break
-                command_and_data = response[index:index+length].decode('ascii', errors='ignore')
-                index += length
-
-                # Read checksum (2 ASCII characters)
-                checksum_str = response[index:index+2].decode('ascii', errors='ignore')
-                index += 2
-
-                # Read ETX
-                if index >= len(response) or response[index] != 0x03:
-                    self.logger.warning("Missing ETX in data response.")
-                    break
-                index += 1  # Skip ETX
-
-                # Verify checksum
-                checksum_input_str = length_str + command_and_data
-                calculated_checksum = self.calculate_checksum_ascii(checksum_input_str)
-                try:
-                    received_checksum = int(checksum_str, 16)
-                except ValueError:
-                    self.logger.warning("Invalid checksum in data response.")
-                    continue
-
-                if received_checksum != calculated_checksum:
-                    self.logger.warning("Checksum mismatch in data response.")
-                    continue
-
-                # Process the data
-                self.logger.debug(f'Command and Data: {command_and_data}')
-                return command_and_data
-            else:
-                # Unexpected byte, skip
-                index += 1
-        return None
+        data_str = response.decode('ascii', errors='ignore')
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f'Command and Data: {data_str}')
+        return data_str
 
     def destroy(self):
+        self._closing = True
+        if self._reconnect_thread is not None:
+            self._reconnect_thread.join()
         if self.ser:
             self.ser.close()
+        self._release_claim()
         self.logger.info('Dispenser Controller Stopped')
 
 def main():
-    node = DispenserController()
+    parser = argparse.ArgumentParser(description='Nordson Ultimus V dispenser command line')
+    parser.add_argument('--port', help='serial port to open instead of scanning, e.g. /dev/ttyUSB0')
+    parser.add_argument('--no-port-cache', action='store_true', help='always scan ports; do not read or write the port cache')
+    parser.add_argument('--clear-port-cache', action='store_true', help='forget all cached ports before connecting')
+    parser.add_argument('--log-level', default='DEBUG', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--trace', type=int, default=0, metavar='N', help='keep the last N raw serial writes/reads')
+    parser.add_argument('--trace-file', help='dump the trace here whenever a transaction fails')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level))
+
+    if args.clear_port_cache:
+        PortCache().clear()
+
+    node = DispenserController(port=args.port, port_cache_path=None if args.no_port_cache else DEFAULT_CACHE_PATH,
+                               trace_size=args.trace or (4096 if args.trace_file else 0), trace_path=args.trace_file)
     node.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,240 @@
+"""
+Nordson Ultimus V emulator on a Linux pseudo-terminal.
+
+The emulator answers the ENQ/ACK, STX-frame, A0/A2 and EOT exchange the
+same way the dispenser does, so DispenserController can open its pty like a
+real serial port:
+
+    with UltimusEmulator(latency=0.002) as emulator:
+        controller = DispenserController(port=emulator.port, init_delay=0)
+"""
+import argparse
+import logging
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+from nordson_protocol import ENQ, ACK, EOT, FrameDecoder, encode_frame
+
+MEMORY_LOCATIONS = 400
+MAX_MEMORY_INDEX = MEMORY_LOCATIONS - 1
+
+# Setpoint limits in device units (tenths of psi, 0.1 ms, tenths of inH2O)
+MAX_PRESSURE = 1000
+MAX_TIME = 99999
+MAX_VACUUM = 180
+
+PRESSURE_UNIT_CODES = (b'00', b'01', b'02')
+VACUUM_UNIT_CODES = (b'00', b'01', b'02', b'03', b'04')
+
+# Host-side states of the ENQ ... EOT exchange
+IDLE = 'idle'
+WAIT_FRAME = 'wait_frame'
+WAIT_DATA_ACK = 'wait_data_ack'
+WAIT_EOT = 'wait_eot'
+
+
+class UltimusEmulator:
+    """
+    Emulated dispenser with 400 memory locations of pressure/time/vacuum.
+
+    - latency: seconds to wait before each reply (ACK, A0/A2, data frame)
+    - drop_rate: probability that any single transmitted byte is lost
+    - corrupt_rate: probability that a transmitted frame gets a bad checksum
+    """
+
+    def __init__(self, latency=0.0, drop_rate=0.0, corrupt_rate=0.0, seed=None):
+        self.logger = logging.getLogger('UltimusEmulator')
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self._random = random.Random(seed)
+
+        # Device state; memory rows are [pressure, time, vacuum] in device units
+        self.memory = [[0, 0, 0] for _ in range(MEMORY_LOCATIONS)]
+        self.memory_location = 0
+        self.is_timed_mode = True
+        self.pressure_units = b'00'
+        self.vacuum_units = b'01'
+        self.dispense_count = 0
+
+        # Counters for tests and benchmarks
+        self.transactions = 0
+        self.failures = 0
+
+        self._state = IDLE
+        self._pending_data = None
+        self._decoder = FrameDecoder()
+        self._master_fd = None
+        self._slave_fd = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.port = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Create the pty and start answering on it. The device path to open
+        is available as `port` afterwards.
+        """
+        self._master_fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        self.port = os.ttyname(self._slave_fd)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._serve, name='UltimusEmulator', daemon=True)
+        self._thread.start()
+        self.logger.info(f'Emulator listening on {self.port}')
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master_fd, self._slave_fd):
+            if fd is not None:
+                os.close(fd)
+        self._master_fd = self._slave_fd = None
+
+    def _serve(self):
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._master_fd], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master_fd, 1024)
+            except OSError:
+                # The slave side has no open reader yet or was closed
+                time.sleep(0.01)
+                continue
+            for byte in data:
+                self._handle_byte(byte)
+
+    def _handle_byte(self, byte):
+        if byte == ENQ[0]:
+            # ENQ always starts a new sequence, whatever state we were in
+            self._state = WAIT_FRAME
+            self._decoder.reset()
+            self._send(ACK)
+        elif self._state == WAIT_FRAME:
+            if byte == EOT[0]:
+                self._state = IDLE
+                return
+            checksum_errors = self._decoder.checksum_errors
+            for payload in self._decoder.feed(bytes((byte,))):
+                self._handle_command(payload)
+            if self._decoder.checksum_errors != checksum_errors:
+                self.logger.debug('Checksum mismatch in received packet')
+                self._send_frame(b'A2')
+                self._state = WAIT_EOT
+        elif self._state == WAIT_DATA_ACK and byte == ACK[0]:
+            self._send_frame(self._pending_data)
+            self._pending_data = None
+            self._state = WAIT_EOT
+        elif byte == EOT[0]:
+            self._state = IDLE
+
+    def _handle_command(self, payload):
+        self.transactions += 1
+        code = payload[:2]
+        data = payload[2:].lstrip(b' ')
+        data_response = None
+        try:
+            if code == b'DI':
+                self.dispense_count += 1
+            elif code == b'TM':
+                self.is_timed_mode = not self.is_timed_mode
+            elif code == b'PS':
+                self._store(0, self._parse_number(data, MAX_PRESSURE))
+            elif code == b'DS':
+                if not data.startswith(b'T'):
+                    raise ValueError(data)
+                self._store(1, self._parse_number(data[1:], MAX_TIME))
+            elif code == b'VS':
+                self._store(2, self._parse_number(data, MAX_VACUUM))
+            elif code == b'E6':
+                if data not in PRESSURE_UNIT_CODES:
+                    raise ValueError(data)
+                self.pressure_units = data
+            elif code == b'E7':
+                if data not in VACUUM_UNIT_CODES:
+                    raise ValueError(data)
+                self.vacuum_units = data
+            elif code == b'CH':
+                self.memory_location = self._parse_number(data, MAX_MEMORY_INDEX)
+            elif code == b'E8':
+                pressure, dispense_time, vacuum = self.memory[self._parse_number(data, MAX_MEMORY_INDEX)]
+                data_response = b'D0PD%04dDT%05dVC%04d' % (pressure, dispense_time, vacuum)
+            else:
+                raise ValueError(code)
+        except ValueError:
+            self.failures += 1
+            self.logger.debug(f'Rejected command {payload}')
+            self._send_frame(b'A2')
+            self._state = WAIT_EOT
+            return
+
+        self._send_frame(b'A0')
+        if data_response is not None:
+            self._pending_data = data_response
+            self._state = WAIT_DATA_ACK
+        else:
+            self._state = WAIT_EOT
+
+    def _parse_number(self, data, maximum):
+        if not data.isdigit():
+            raise ValueError(data)
+        value = int(data)
+        if value > maximum:
+            raise ValueError(data)
+        return value
+
+    def _store(self, column, value):
+        self.memory[self.memory_location][column] = value
+
+    def _send_frame(self, payload):
+        frame = encode_frame(payload)
+        if self.corrupt_rate and self._random.random() < self.corrupt_rate:
+            # Replace the low checksum digit, keeping it valid ASCII hex
+            corrupted = bytearray(frame)
+            corrupted[-2] = ord('0') if corrupted[-2] != ord('0') else ord('1')
+            frame = bytes(corrupted)
+        self._send(frame)
+
+    def _send(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.drop_rate:
+            data = bytes(byte for byte in data if self._random.random() >= self.drop_rate)
+        if data:
+            os.write(self._master_fd, data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run an emulated Ultimus V dispenser on a pseudo-terminal')
+    parser.add_argument('--latency', type=float, default=0.0, help='reply latency in seconds')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='probability of dropping each sent byte')
+    parser.add_argument('--corrupt-rate', type=float, default=0.0, help='probability of corrupting each sent checksum')
+    parser.add_argument('--seed', type=int, help='random seed for drops and corruption')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with UltimusEmulator(args.latency, args.drop_rate, args.corrupt_rate, args.seed) as emulator:
+        print(f'Emulated dispenser on {emulator.port}; run: python nordson_dispenser_control.py --port {emulator.port}')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Fleet layer for stations with several Ultimus V dispensers.
+
+Every candidate port is opened and probed in parallel, so startup takes
+about as long as one device initialization. Commands go to one, some or all
+dispensers at once through a worker pool:
+
+    with DispenserFleet() as fleet:
+        fleet.discover()
+        results = fleet.broadcast('set_pressure', 12.5)
+"""
+import argparse
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import serial.tools.list_ports
+
+from nordson_dispenser_control import DispenserController, INIT_DELAY
+
+# Outcome of one command on one dispenser; `error` is the exception raised,
+# if any, and `seconds` the wall time the call took on that device
+DeviceResult = namedtuple('DeviceResult', ['port', 'result', 'error', 'seconds'])
+
+
+class DispenserFleet:
+    """
+    A set of DispenserControllers, one per port that answered the ENQ/ACK probe.
+
+    - ports: device paths to try; all serial ports when None
+    - match: optional predicate on a list_ports entry to filter candidates,
+      e.g. lambda port: port.vid == 0x0403
+    - init_timeout: how long a freshly opened device may take to answer
+    """
+
+    def __init__(self, ports=None, match=None, init_timeout=INIT_DELAY, max_workers=None):
+        self.logger = logging.getLogger('DispenserFleet')
+        self.ports = ports
+        self.match = match
+        self.init_timeout = init_timeout
+        self.max_workers = max_workers
+        self.controllers = {}
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def candidate_ports(self):
+        if self.ports is not None:
+            return list(self.ports)
+        return [port.device for port in serial.tools.list_ports.comports()
+                if self.match is None or self.match(port)]
+
+    def discover(self):
+        """
+        Open and probe every candidate port in parallel and keep the ones
+        where an Ultimus V answers. Returns the list of dispenser ports.
+        """
+        candidates = [port for port in self.candidate_ports() if port not in self.controllers]
+        if not candidates:
+            return sorted(self.controllers)
+        started = time.monotonic()
+        executor = self._get_executor(len(candidates))
+        for port, controller in zip(candidates, executor.map(self._open_and_probe, candidates)):
+            if controller:
+                self.controllers[port] = controller
+        self.logger.info(f'Found {len(self.controllers)} dispenser(s) among {len(candidates)} port(s) '
+                         f'in {time.monotonic() - started:.2f} s')
+        return sorted(self.controllers)
+
+    def _open_and_probe(self, port):
+        controller = DispenserController(port=port, init_delay=0)
+        if controller.ser and controller.wait_until_ready(self.init_timeout):
+            return controller
+        self.logger.info(f'No Ultimus V answering on {port}')
+        controller.destroy()
+        return None
+
+    def execute(self, method, *args, ports=None, **kwargs):
+        """
+        Call a DispenserController method (e.g. 'set_pressure') on the given
+        ports, or on every dispenser, concurrently. Returns a dict of port to
+        DeviceResult.
+        """
+        targets = sorted(self.controllers) if ports is None else list(ports)
+        unknown = [port for port in targets if port not in self.controllers]
+        if unknown:
+            raise KeyError(f'Not a connected dispenser: {", ".join(unknown)}')
+        executor = self._get_executor(len(targets))
+        futures = {
+            port: executor.submit(self._call, port, method, args, kwargs)
+            for port in targets
+        }
+        return {port: future.result() for port, future in futures.items()}
+
+    def broadcast(self, method, *args, **kwargs):
+        """
+        Call a method on every dispenser in the fleet concurrently.
+        """
+        return self.execute(method, *args, **kwargs)
+
+    def _call(self, port, method, args, kwargs):
+        started = time.perf_counter()
+        try:
+            result = getattr(self.controllers[port], method)(*args, **kwargs)
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+        return DeviceResult(port, result, error, time.perf_counter() - started)
+
+    def _get_executor(self, workers):
+        # One worker per device so a slow dispenser never delays the others
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers or max(workers, 8),
+                                                thread_name_prefix='DispenserFleet')
+        return self._executor
+
+    def close(self):
+        for controller in self.controllers.values():
+            controller.destroy()
+        self.controllers.clear()
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send a command to several Ultimus V dispensers at once')
+    parser.add_argument('--ports', nargs='+', help='ports to use instead of scanning all serial ports')
+    parser.add_argument('command', nargs='+', help="command as typed in the CLI, e.g. 'pressure 12.5'")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with DispenserFleet(ports=args.ports) as fleet:
+        if not fleet.discover():
+            print('No dispensers found')
+            return
+        results = fleet.broadcast('dispenser_callback', ' '.join(args.command))
+        for port, outcome in results.items():
+            status = f'error: {outcome.error}' if outcome.error else outcome.result
+            print(f'{port}: {status} ({outcome.seconds * 1000:.1f} ms)')
+
+
+if __name__ == '__main__':
+    main()
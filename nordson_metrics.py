@@ -0,0 +1,189 @@
+"""
+Per-phase transaction timing and error counters for DispenserController.
+
+Durations are recorded in nanoseconds from time.monotonic_ns() into fixed
+histogram buckets, so recording is a bisect and two additions and can stay
+enabled in production. Snapshots export as JSON or as a Prometheus text
+file (e.g. for the node_exporter textfile collector).
+"""
+import json
+import os
+from bisect import bisect_left
+
+# Phases of an ENQ ... EOT transaction
+PHASES = (
+    'enq_ack',          # ENQ sent -> ACK received
+    'packet_response',  # command packet sent -> A0/A2 frame received
+    'ack_data',         # ACK sent -> data frame received (read commands)
+    'data_eot',         # data frame received -> EOT sent (read commands)
+    'total',            # ENQ sent -> transaction finished
+)
+
+# Error counters kept per command code; exported as 0 for every command
+# seen, so a healthy controller reports its error series too
+COUNTERS = ('timeout', 'missing_ack', 'checksum_mismatch', 'a2_failure', 'serial_error', 'retry')
+
+# Histogram upper bounds in nanoseconds: 50 us ... 1 s, then +Inf
+BUCKET_BOUNDS_NS = (
+    50_000, 100_000, 250_000, 500_000,
+    1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000,
+    100_000_000, 250_000_000, 500_000_000, 1_000_000_000,
+)
+
+
+class PhaseHistogram:
+    """
+    Fixed-bucket latency histogram; counts are per bucket (not cumulative).
+    """
+    __slots__ = ('counts', 'count', 'sum_ns', 'max_ns')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_NS) + 1)
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns):
+        self.counts[bisect_left(BUCKET_BOUNDS_NS, duration_ns)] += 1
+        self.count += 1
+        self.sum_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum_ns': self.sum_ns,
+            'max_ns': self.max_ns,
+            'mean_ns': self.sum_ns / self.count if self.count else 0,
+            'buckets': {
+                ('+Inf' if index == len(BUCKET_BOUNDS_NS) else str(BUCKET_BOUNDS_NS[index])): count
+                for index, count in enumerate(self.counts)
+            },
+        }
+
+
+class TransactionMetrics:
+    """
+    Per-command-code phase histograms, transaction counts and error counters.
+
+    `labels` (e.g. {'port': '/dev/ttyUSB0'}) are attached to every exported
+    Prometheus sample so several controllers can share one scrape target.
+    """
+
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self.reset()
+
+    def reset(self):
+        self.histograms = {}
+        self.transactions = {}
+        self.counters = {}
+
+    def record_phase(self, command, phase, duration_ns):
+        key = (command, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = PhaseHistogram()
+        histogram.record(duration_ns)
+
+    def count_transaction(self, command):
+        self.transactions[command] = self.transactions.get(command, 0) + 1
+
+    def increment(self, command, counter, amount=1):
+        key = (command, counter)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def _commands(self):
+        commands = set(self.transactions)
+        commands.update(command for command, _ in self.counters)
+        commands.update(command for command, _ in self.histograms)
+        return sorted(commands)
+
+    def _errors(self, command):
+        # Every known counter, then any other counter recorded for `command`
+        errors = {counter: self.counters.get((command, counter), 0) for counter in COUNTERS}
+        for (counter_command, counter), count in sorted(self.counters.items()):
+            if counter_command == command and counter not in errors:
+                errors[counter] = count
+        return errors
+
+    def _phases(self, command):
+        # Recorded phases in transaction order
+        order = {phase: index for index, phase in enumerate(PHASES)}
+        phases = [(phase, histogram) for (phase_command, phase), histogram in self.histograms.items()
+                  if phase_command == command]
+        return sorted(phases, key=lambda item: (order.get(item[0], len(PHASES)), item[0]))
+
+    def snapshot(self):
+        """
+        Return all metrics as a JSON-serializable dict keyed by command code.
+        """
+        commands = {}
+        for command in self._commands():
+            commands[command] = {
+                'transactions': self.transactions.get(command, 0),
+                'errors': self._errors(command),
+                'phases': {phase: histogram.snapshot() for phase, histogram in self._phases(command)},
+            }
+        return {'labels': self.labels, 'commands': commands}
+
+    def prometheus_text(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            '# HELP nordson_transactions_total Completed dispenser transactions.',
+            '# TYPE nordson_transactions_total counter',
+        ]
+        commands = self._commands()
+        for command in commands:
+            count = self.transactions.get(command, 0)
+            lines.append(f'nordson_transactions_total{{{self._labels(command=command)}}} {count}')
+
+        lines += [
+            '# HELP nordson_transaction_errors_total Dispenser transaction errors by type.',
+            '# TYPE nordson_transaction_errors_total counter',
+        ]
+        for command in commands:
+            for counter, count in self._errors(command).items():
+                lines.append(f'nordson_transaction_errors_total{{{self._labels(command=command, error=counter)}}} {count}')
+
+        lines += [
+            '# HELP nordson_transaction_phase_seconds Duration of each transaction phase.',
+            '# TYPE nordson_transaction_phase_seconds histogram',
+        ]
+        for command in commands:
+            for phase, histogram in self._phases(command):
+                self._histogram_lines(lines, command, phase, histogram)
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_lines(self, lines, command, phase, histogram):
+        cumulative = 0
+        for index, count in enumerate(histogram.counts):
+            cumulative += count
+            bound = '+Inf' if index == len(BUCKET_BOUNDS_NS) else repr(BUCKET_BOUNDS_NS[index] / 1e9)
+            labels = self._labels(command=command, phase=phase, le=bound)
+            lines.append(f'nordson_transaction_phase_seconds_bucket{{{labels}}} {cumulative}')
+        labels = self._labels(command=command, phase=phase)
+        lines.append(f'nordson_transaction_phase_seconds_sum{{{labels}}} {histogram.sum_ns / 1e9!r}')
+        lines.append(f'nordson_transaction_phase_seconds_count{{{labels}}} {histogram.count}')
+
+    def export(self, path):
+        """
+        Write a snapshot to `path`: Prometheus text for a '.prom' file,
+        JSON otherwise. The file is replaced atomically so a scraper never
+        reads a partial file.
+        """
+        if path.endswith('.prom'):
+            content = self.prometheus_text()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as f:
+            f.write(content)
+        os.replace(temporary_path, path)
+
+    def _labels(self, **extra):
+        labels = dict(self.labels, **extra)
+        return ','.join(f'{name}="{value}"' for name, value in labels.items())
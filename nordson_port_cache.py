@@ -0,0 +1,138 @@
+"""
+On-disk cache of serial ports where an Ultimus V was found.
+
+Each entry remembers how to recognize the port again (device path, USB
+serial number, VID/PID), the serial settings that worked and the last known
+device state (pressure/vacuum units, timed or steady mode), so the next
+start can try that port first instead of rediscovering it.
+"""
+import json
+import logging
+import os
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'nordson_ultimus', 'ports.json')
+
+# Serial settings worth restoring; timeouts are chosen by the controller
+CACHED_SETTINGS = ('baudrate', 'bytesize', 'parity', 'stopbits', 'xonxoff', 'rtscts', 'dsrdtr')
+
+
+class PortCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.logger = logging.getLogger('PortCache')
+        self.path = path
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Ignoring unreadable port cache {self.path}: {e}')
+            return []
+        return entries if isinstance(entries, list) else []
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary_path = f'{self.path}.tmp'
+            with open(temporary_path, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            self.logger.warning(f'Could not write port cache {self.path}: {e}')
+
+    def clear(self):
+        """
+        Forget every cached port (explicit invalidation).
+        """
+        self.entries = []
+        self.save()
+
+    def forget(self, device):
+        self.entries = [entry for entry in self.entries if entry['device'] != device]
+        self.save()
+
+    def candidates(self, available_ports):
+        """
+        Return (device, entry) pairs for cached dispensers among the
+        available list_ports entries, most recently used first. A USB serial
+        number match wins over the device path, which can change between
+        boots; VID/PID is only used when it identifies a single port.
+        """
+        matches = []
+        for entry in sorted(self.entries, key=lambda entry: entry.get('last_seen', 0), reverse=True):
+            port = self._match(entry, available_ports)
+            if port is not None and all(port.device != device for device, _ in matches):
+                matches.append((port.device, entry))
+        return matches
+
+    def _match(self, entry, available_ports):
+        if entry.get('serial_number'):
+            for port in available_ports:
+                if port.serial_number == entry['serial_number']:
+                    return port
+        for port in available_ports:
+            if port.device == entry['device']:
+                return port
+        if entry.get('vid') is not None:
+            same_model = [port for port in available_ports
+                          if port.vid == entry['vid'] and port.pid == entry.get('pid')]
+            if len(same_model) == 1:
+                return same_model[0]
+        return None
+
+    def same_adapter(self, entry, available_ports):
+        """
+        Return the devices among the available list_ports entries that are
+        certainly the adapter `entry` was recorded for: the one with its USB
+        serial number or, without one, the only port with its VID/PID.
+        Returns None if the entry has no USB identity to match.
+        """
+        if entry.get('serial_number'):
+            return [port.device for port in available_ports if port.serial_number == entry['serial_number']]
+        if entry.get('vid') is not None:
+            same_model = [port.device for port in available_ports
+                          if port.vid == entry['vid'] and port.pid == entry.get('pid')]
+            return same_model if len(same_model) == 1 else []
+        return None
+
+    def remember(self, port_info, settings, entry=None):
+        """
+        Record a port where a dispenser answered. `port_info` is a list_ports
+        entry, `settings` the serial settings dict of the open port and
+        `entry` the cached entry it was matched to, if any.
+        """
+        if entry is None:
+            entry = self.lookup(port_info.device)
+        if entry is None:
+            entry = {'state': {}}
+            self.entries.append(entry)
+        entry.update({
+            'device': port_info.device,
+            'serial_number': port_info.serial_number,
+            'vid': port_info.vid,
+            'pid': port_info.pid,
+            'description': port_info.description,
+            'settings': {name: settings[name] for name in CACHED_SETTINGS if name in settings},
+            'last_seen': time.time(),
+        })
+        self.save()
+        return entry
+
+    def lookup(self, device):
+        for entry in self.entries:
+            if entry['device'] == device:
+                return entry
+        return None
+
+    def update_state(self, device, **state):
+        """
+        Store last known device state, e.g. update_state(port, timed_mode=False).
+        """
+        entry = self.lookup(device)
+        if entry is not None and any(entry['state'].get(name) != value for name, value in state.items()):
+            entry['state'].update(state)
+            self.save()
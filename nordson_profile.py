@@ -0,0 +1,207 @@
+"""
+Time-varying pressure or vacuum profiles streamed to the dispenser.
+
+A profile is an array of (timestamp in seconds, setpoint) rows, from NumPy
+or a CSV file. All PS/VS frames are validated and encoded in one vectorized
+pass, then sent on monotonic deadlines. When the link falls behind, points
+whose successor is already due are skipped so the device follows the
+newest setpoint instead of a growing backlog:
+
+    python nordson_profile.py bead.csv --command pressure --report bead_report.csv
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from nordson_protocol import COMMANDS, ETX, SETPOINT_RANGES, STX
+from nordson_timing import wait_until
+
+# Commands a profile can stream; their ranges are in SETPOINT_RANGES
+PROFILE_COMMANDS = ('pressure', 'vacuum')
+
+# Per-point status in a ProfileReport
+SENT = 0
+FAILED = 1
+SKIPPED = 2
+STATUS_NAMES = {SENT: 'sent', FAILED: 'failed', SKIPPED: 'skipped'}
+
+_HEX_DIGITS = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)
+_DIGIT_WEIGHTS = np.array([1000, 100, 10, 1], dtype=np.int64)
+
+
+def load_profile(source):
+    """
+    Return a profile as a float64 array of shape (N, 2): timestamps in
+    seconds from the start of playback, and setpoints. `source` is an array
+    or a CSV path; a header line in the CSV is skipped.
+    """
+    if isinstance(source, str):
+        with open(source) as f:
+            first_line = f.readline()
+        has_header = any(character.isalpha() for character in first_line)
+        profile = np.loadtxt(source, delimiter=',', skiprows=1 if has_header else 0, ndmin=2)
+    else:
+        profile = np.asarray(source, dtype=np.float64)
+    if profile.ndim != 2 or profile.shape[1] != 2 or len(profile) == 0:
+        raise ValueError(f'A profile needs (timestamp, setpoint) rows, got shape {profile.shape}')
+    if not np.isfinite(profile).all():
+        raise ValueError('Profile contains NaN or infinite values')
+    timestamps = profile[:, 0]
+    if timestamps[0] < 0 or np.any(np.diff(timestamps) < 0):
+        raise ValueError('Profile timestamps must be non-negative and non-decreasing')
+    return profile.astype(np.float64, copy=False)
+
+
+def encode_profile(setpoints, command='pressure'):
+    """
+    Validate setpoints against the command's range and encode every frame
+    at once, with the same int(value * 10) formatting as the single
+    commands. Returns a list of frames (bytes).
+    """
+    if command not in PROFILE_COMMANDS:
+        raise ValueError(f'Profiles support {list(PROFILE_COMMANDS)}, not {command}')
+    low, high = SETPOINT_RANGES[command]
+    setpoints = np.asarray(setpoints, dtype=np.float64)
+    # Written so that NaN fails the check too
+    invalid = np.flatnonzero(~((setpoints >= low) & (setpoints <= high)))
+    if invalid.size:
+        index = invalid[0]
+        # Reuse the command's own error message
+        COMMANDS[command].format(float(setpoints[index]))
+        raise ValueError(f'Invalid {command} value at point {index}: {setpoints[index]}')
+
+    code = COMMANDS[command].code.encode('ascii')
+    length_field = b'%02X' % (len(code) + 4)
+    header = np.frombuffer(STX + length_field + code, dtype=np.uint8)
+
+    # Truncate like int(), then split into four ASCII digits
+    device_values = (setpoints * 10).astype(np.int64)
+    digits = (device_values[:, None] // _DIGIT_WEIGHTS) % 10 + ord('0')
+    checksums = (-(int(header[1:].sum()) + digits.sum(axis=1))) & 0xFF
+
+    frames = np.empty((len(setpoints), len(header) + 7), dtype=np.uint8)
+    frames[:, :len(header)] = header
+    frames[:, len(header):len(header) + 4] = digits
+    frames[:, -3] = _HEX_DIGITS[checksums >> 4]
+    frames[:, -2] = _HEX_DIGITS[checksums & 0x0F]
+    frames[:, -1] = ETX[0]
+
+    blob = frames.tobytes()
+    size = frames.shape[1]
+    return [blob[offset:offset + size] for offset in range(0, len(blob), size)]
+
+
+class ProfileReport:
+    """
+    Requested vs. achieved timing of every profile point. `points` is a
+    structured array with, per point, the requested offset, when sending
+    started and finished (NaN if skipped), the lateness and the status.
+    All times are seconds from the start of playback.
+    """
+    dtype = np.dtype([
+        ('requested', 'f8'),
+        ('setpoint', 'f8'),
+        ('sent', 'f8'),
+        ('completed', 'f8'),
+        ('lateness', 'f8'),
+        ('status', 'u1'),
+    ])
+
+    def __init__(self, profile):
+        self.points = np.zeros(len(profile), dtype=self.dtype)
+        self.points['requested'] = profile[:, 0]
+        self.points['setpoint'] = profile[:, 1]
+        self.points['sent'] = np.nan
+        self.points['completed'] = np.nan
+        self.points['lateness'] = np.nan
+        self.points['status'] = SKIPPED
+
+    def summary(self):
+        status = self.points['status']
+        sent = self.points[status != SKIPPED]
+        lateness = sent['lateness'] * 1000
+        duration = sent['completed'] - sent['sent']
+        return {
+            'points': len(self.points),
+            'sent': int(np.count_nonzero(status == SENT)),
+            'failed': int(np.count_nonzero(status == FAILED)),
+            'skipped': int(np.count_nonzero(status == SKIPPED)),
+            'lateness_p50_ms': float(np.percentile(lateness, 50)) if len(sent) else None,
+            'lateness_p95_ms': float(np.percentile(lateness, 95)) if len(sent) else None,
+            'lateness_max_ms': float(lateness.max()) if len(sent) else None,
+            'transaction_mean_ms': float(duration.mean() * 1000) if len(sent) else None,
+        }
+
+    def to_csv(self, path):
+        with open(path, 'w') as f:
+            f.write('requested,setpoint,sent,completed,lateness,status\n')
+            for point in self.points:
+                f.write(f"{point['requested']:.6f},{point['setpoint']:g},{point['sent']:.6f},"
+                        f"{point['completed']:.6f},{point['lateness']:.6f},{STATUS_NAMES[point['status']]}\n")
+
+
+def play_profile(controller, profile, command='pressure', lead_time=0.01):
+    """
+    Stream a profile to the controller on monotonic deadlines, starting
+    `lead_time` seconds from now. Blocks until the last point was sent and
+    returns a ProfileReport.
+    """
+    profile = load_profile(profile)
+    frames = encode_profile(profile[:, 1], command)
+    report = ProfileReport(profile)
+    points = report.points
+    start = time.monotonic() + lead_time
+    deadlines = start + profile[:, 0]
+
+    last_sent = None
+    index = 0
+    count = len(frames)
+    while index < count:
+        wait_until(deadlines[index])
+        now = time.monotonic()
+        # Behind schedule: jump to the newest point that is already due
+        while index + 1 < count and deadlines[index + 1] <= now:
+            index += 1
+        points['sent'][index] = now - start
+        points['lateness'][index] = now - deadlines[index]
+        ok = controller.send_packet(frames[index])
+        points['completed'][index] = time.monotonic() - start
+        points['status'][index] = SENT if ok else FAILED
+        if ok:
+            last_sent = index
+        index += 1
+
+    # The frames bypassed the typed API, so bring the shadow up to date
+    controller.shadow.invalidate(command)
+    if last_sent is not None and last_sent == count - 1:
+        controller.shadow.apply(command, float(profile[last_sent, 1]))
+    return report
+
+
+def main():
+    from nordson_dispenser_control import DispenserController
+
+    parser = argparse.ArgumentParser(description='Play a pressure or vacuum profile on an Ultimus V')
+    parser.add_argument('profile', help='CSV file of timestamp,setpoint rows')
+    parser.add_argument('--command', choices=PROFILE_COMMANDS, default='pressure')
+    parser.add_argument('--port', help='serial port, e.g. /dev/ttyUSB0')
+    parser.add_argument('--report', help='write per-point timing to this CSV file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    profile = load_profile(args.profile)
+    controller = DispenserController(port=args.port)
+    try:
+        report = play_profile(controller, profile, args.command)
+    finally:
+        controller.destroy()
+    for name, value in report.summary().items():
+        print(f'{name}: {value}')
+    if args.report:
+        report.to_csv(args.report)
+
+
+if __name__ == '__main__':
+    main()
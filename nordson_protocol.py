@@ -0,0 +1,327 @@
+"""
+Framing helpers for the Nordson Ultimus V RS-232 protocol.
+
+A frame on the wire is: STX, two ASCII hex length characters, the command
+and data (length characters), two ASCII hex checksum characters, ETX.
+"""
+import random
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+# Protocol control bytes
+ENQ = b'\x05'
+ACK = b'\x06'
+EOT = b'\x04'
+STX = b'\x02'
+ETX = b'\x03'
+
+_STX_BYTE = STX[0]
+_ETX_BYTE = ETX[0]
+
+# Frame overhead: STX + 2 length chars + 2 checksum chars + ETX
+FRAME_OVERHEAD = 6
+
+# Value of every byte as an ASCII hex digit, -1 when it is not one
+_HEX_VALUE = [-1] * 256
+for _i, _c in enumerate(b'0123456789ABCDEF'):
+    _HEX_VALUE[_c] = _i
+for _i, _c in enumerate(b'abcdef'):
+    _HEX_VALUE[_c] = 10 + _i
+
+
+def _parse_hex_pair(buffer, index):
+    """
+    Return the value of the two ASCII hex digits at buffer[index], or -1.
+    """
+    high = _HEX_VALUE[buffer[index]]
+    low = _HEX_VALUE[buffer[index + 1]]
+    if high < 0 or low < 0:
+        return -1
+    return (high << 4) | low
+
+
+def encode_frame(payload):
+    """
+    Wrap a command+data payload (bytes) in STX/length/checksum/ETX framing.
+    """
+    length_field = b'%02X' % len(payload)
+    checksum = -(sum(length_field) + sum(payload)) & 0xFF
+    return STX + length_field + payload + b'%02X' % checksum + ETX
+
+
+@lru_cache(maxsize=4096)
+def encode_command(command_code, data=''):
+    """
+    Encode a command code (e.g. 'PS  ') and its data string to a complete
+    frame. Results are memoized, so fixed frames such as 'DI  ' and repeated
+    setpoints are only built once.
+    """
+    return encode_frame((command_code + data).encode('ascii'))
+
+
+# Typed values read back from a memory location with E8
+MemoryValues = namedtuple('MemoryValues', ['pressure', 'time', 'vacuum'])
+
+PRESSURE_UNITS = {'psi': '00', 'bar': '01', 'kpa': '02'}
+VACUUM_UNITS = {'kpa': '00', 'inches_h2o': '01', 'inches_hg': '02', 'mmhg': '03', 'torr': '04'}
+
+
+# Valid setpoint ranges: psi, seconds and inH2O
+SETPOINT_RANGES = {
+    'pressure': (0.0, 100.0),
+    'time': (0.0, 9.9999),
+    'vacuum': (0.0, 18.0),
+}
+
+
+def format_pressure(pressure_value):
+    low, high = SETPOINT_RANGES['pressure']
+    if not low <= pressure_value <= high:
+        raise ValueError(f'Invalid pressure value: {pressure_value}. Must be between {low} and {high} psi')
+    return f"{int(pressure_value * 10):04d}"
+
+
+def format_vacuum(vacuum_value):
+    low, high = SETPOINT_RANGES['vacuum']
+    if not low <= vacuum_value <= high:
+        raise ValueError(f'Invalid vacuum value: {vacuum_value}. Must be between {low} and {high} inH2O')
+    return f"{int(vacuum_value * 10):04d}"
+
+
+def format_time(time_value):
+    low, high = SETPOINT_RANGES['time']
+    if not low <= time_value <= high:
+        raise ValueError(f'Invalid time value: {time_value}. Must be between {low:.4f} and {high:.4f} seconds')
+    # Remove decimal point and format as per the manual
+    if time_value < 1.0000:
+        return f"T{int(time_value * 10000):04d}"
+    return f"T{int(time_value * 10000):05d}"
+
+
+def format_memory_location(memory_location):
+    if not 0 <= memory_location <= 399:
+        raise ValueError(f'Invalid memory location: {memory_location}. Must be between 0 and 399')
+    return f"{memory_location:03d}"
+
+
+def format_pressure_units(unit):
+    try:
+        return PRESSURE_UNITS[unit.lower()]
+    except KeyError:
+        raise ValueError(f'Invalid pressure unit: {unit}. Must be one of {list(PRESSURE_UNITS.keys())}') from None
+
+
+def format_vacuum_units(unit):
+    try:
+        return VACUUM_UNITS[unit.lower()]
+    except KeyError:
+        raise ValueError(f'Invalid vacuum unit: {unit}. Must be one of {list(VACUUM_UNITS.keys())}') from None
+
+
+# A command: its code on the wire, a formatter that validates a typed value
+# and returns the data string (None for commands without data), and whether
+# the device sends a data frame after A0
+CommandSpec = namedtuple('CommandSpec', ['code', 'format', 'expect_response'])
+
+COMMANDS = {
+    'start': CommandSpec('DI  ', None, False),
+    # Steady mode dispensing is started and stopped by the same DI command
+    'stop': CommandSpec('DI  ', None, False),
+    'toggle_mode': CommandSpec('TM  ', None, False),
+    'pressure': CommandSpec('PS  ', format_pressure, False),
+    'vacuum': CommandSpec('VS  ', format_vacuum, False),
+    'time': CommandSpec('DS  ', format_time, False),
+    'read_values': CommandSpec('E8', format_memory_location, True),
+    # Selects the memory location that PS/DS/VS write to
+    'memory_location': CommandSpec('CH  ', format_memory_location, False),
+    'pressure_units': CommandSpec('E6  ', format_pressure_units, False),
+    'vacuum_units': CommandSpec('E7  ', format_vacuum_units, False),
+}
+
+# Command codes whose effect repeats when the same frame is sent twice: DI
+# fires another shot or toggles steady dispensing, TM flips the mode back
+NON_REPEATABLE_CODES = frozenset({b'DI', b'TM'})
+
+
+def encode(name, value=None):
+    """
+    Validate `value` for the registered command `name` and return its frame.
+    Raises ValueError for out-of-range values.
+    """
+    spec = COMMANDS[name]
+    data = spec.format(value) if spec.format else ''
+    return encode_command(spec.code, data)
+
+
+def parse_memory_values(data):
+    """
+    Parse an E8 data payload (bytes or str) of the form D0PDppppDTtttttVCvvvv.
+    Raises ValueError if the payload does not have that format.
+    """
+    if isinstance(data, bytes):
+        data = data.decode('ascii', errors='ignore')
+    if not data.startswith('D0'):
+        raise ValueError("Invalid response format: Missing 'D0'")
+    if data[2:4] != 'PD':
+        raise ValueError("Invalid response format: Missing 'PD'")
+    if data[8:10] != 'DT':
+        raise ValueError("Invalid response format: Missing 'DT'")
+    if data[15:17] != 'VC':
+        raise ValueError("Invalid response format: Missing 'VC'")
+    # Assuming pressure in psi and vacuum in inH2O
+    return MemoryValues(int(data[4:8]) / 10.0, int(data[10:15]) / 10000.0, int(data[17:21]) / 10.0)
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for STX...ETX frames.
+
+    Accepts arbitrary chunks (bytes, bytearray or memoryview) through feed()
+    and returns the payloads (command + data, as bytes) of every frame that
+    completed with a valid checksum. Partial frames are kept until the rest
+    arrives, so a frame split across serial reads is not lost. The bytes of
+    a partial frame already searched for an ETX are not searched again, so
+    the cost of a feed() is proportional to the new bytes.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # Bytes of the partial frame at the start of the buffer that are
+        # known to hold no ETX
+        self._scanned = 0
+        self.frames_decoded = 0
+        self.checksum_errors = 0
+        self.framing_errors = 0
+
+    def reset(self):
+        """
+        Drop any partially received frame.
+        """
+        self._buffer.clear()
+        self._scanned = 0
+
+    @property
+    def buffered(self):
+        """
+        Number of bytes held while waiting for the rest of a frame.
+        """
+        return len(self._buffer)
+
+    def feed(self, data):
+        """
+        Add received bytes and return the list of newly completed payloads.
+        Bytes outside of frames, malformed frames and frames with a bad
+        checksum are discarded and counted.
+        """
+        buffer = self._buffer
+        buffer += data
+        end = len(buffer)
+        frames = []
+        position = 0
+        scanned = self._scanned
+        self._scanned = 0
+        while True:
+            start = buffer.find(_STX_BYTE, position)
+            if start == -1:
+                # Nothing but noise left, drop it all
+                position = end
+                break
+            if start + 3 > end:
+                # Length field not complete yet
+                position = start
+                break
+            length = _parse_hex_pair(buffer, start + 1)
+            if length < 0:
+                self.framing_errors += 1
+                position = start + 1
+                continue
+            etx_index = start + FRAME_OVERHEAD - 1 + length
+            # ETX never appears inside a frame, so an early one means the
+            # length field was corrupted; resync on the next STX
+            # A partial frame kept from the last feed() starts at 0
+            scan_from = max(start + 3, scanned) if start == 0 else start + 3
+            early_etx = buffer.find(_ETX_BYTE, scan_from, min(etx_index, end))
+            if early_etx != -1:
+                self.framing_errors += 1
+                position = start + 1
+                continue
+            if etx_index >= end:
+                # Wait for the rest of the frame
+                position = start
+                self._scanned = end - start
+                break
+            if buffer[etx_index] != _ETX_BYTE:
+                self.framing_errors += 1
+                position = start + 1
+                continue
+            received_checksum = _parse_hex_pair(buffer, etx_index - 2)
+            calculated_checksum = -sum(buffer[start + 1:etx_index - 2]) & 0xFF
+            position = etx_index + 1
+            if received_checksum != calculated_checksum:
+                self.checksum_errors += 1
+                continue
+            frames.append(bytes(buffer[start + 3:etx_index - 2]))
+        if position:
+            del buffer[:position]
+        self.frames_decoded += len(frames)
+        return frames
+
+
+def _synthetic_stream(frame_count, seed=0):
+    """
+    Build a byte stream of typical device traffic: A0/A2 replies, E8 data
+    frames and the odd stray control byte between them.
+    """
+    rng = random.Random(seed)
+    templates = [
+        encode_frame(b'A0'),
+        encode_frame(b'A2'),
+        encode_frame(b'D0PD0125DT05000VC0010'),
+        encode_frame(b'D0PD1000DT99999VC0180'),
+    ]
+    parts = []
+    for _ in range(frame_count):
+        parts.append(rng.choice(templates))
+        if rng.random() < 0.05:
+            parts.append(rng.choice((ACK, EOT, b'\x00')))
+    return b''.join(parts)
+
+
+def benchmark_decoder(frame_count=200000, max_chunk=64, seed=0):
+    """
+    Feed a large synthetic stream through FrameDecoder in random-sized
+    chunks and return the throughput figures as a dict.
+    """
+    stream = _synthetic_stream(frame_count, seed)
+    rng = random.Random(seed)
+    view = memoryview(stream)
+    chunks = []
+    index = 0
+    while index < len(stream):
+        size = rng.randint(1, max_chunk)
+        chunks.append(view[index:index + size])
+        index += size
+
+    decoder = FrameDecoder()
+    decoded = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        decoded += len(decoder.feed(chunk))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'frames': decoded,
+        'bytes': len(stream),
+        'chunks': len(chunks),
+        'seconds': elapsed,
+        'frames_per_second': decoded / elapsed,
+        'megabytes_per_second': len(stream) / elapsed / 1e6,
+    }
+
+
+if __name__ == '__main__':
+    result = benchmark_decoder()
+    print(f"Decoded {result['frames']} frames ({result['bytes']} bytes in {result['chunks']} chunks) "
+          f"in {result['seconds']:.3f} s: {result['frames_per_second']:,.0f} frames/s, "
+          f"{result['megabytes_per_second']:.1f} MB/s")
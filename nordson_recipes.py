@@ -0,0 +1,350 @@
+"""
+Bulk download and upload of the 400 recipe memory locations.
+
+download_memory() reads a range of locations with back-to-back E8
+transactions into a MemoryTable. upload_memory() writes a recipe table back
+with CH/PS/DS/VS. Tables export to CSV or JSON, and MemoryCache keeps a local
+copy per dispenser until it is explicitly invalidated:
+
+    python nordson_recipes.py download --output recipes.csv
+    python nordson_recipes.py upload recipes.csv
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from array import array
+
+from nordson_dispenser_control import DispenserController
+from nordson_protocol import COMMANDS, MemoryValues, encode, encode_command, parse_memory_values
+from nordson_shadow import SETPOINTS
+
+MEMORY_LOCATIONS = 400
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'nordson_ultimus', 'memory')
+
+CSV_FIELDS = ('location', 'pressure', 'time', 'vacuum')
+
+
+class MemoryTable:
+    """
+    Pressure/time/vacuum for the 400 memory locations, stored as compact
+    integer columns in device units (0.1 psi, 0.1 ms, 0.1 inH2O) so values
+    round-trip exactly. Locations that were never loaded read as None.
+    """
+
+    def __init__(self):
+        self.pressure = array('H', [0]) * MEMORY_LOCATIONS
+        self.time = array('I', [0]) * MEMORY_LOCATIONS
+        self.vacuum = array('H', [0]) * MEMORY_LOCATIONS
+        self.loaded = bytearray(MEMORY_LOCATIONS)
+
+    def __len__(self):
+        return sum(self.loaded)
+
+    def __contains__(self, location):
+        return 0 <= location < MEMORY_LOCATIONS and bool(self.loaded[location])
+
+    def __eq__(self, other):
+        return (isinstance(other, MemoryTable) and self.loaded == other.loaded
+                and all(self.get(location) == other.get(location) for location in self.locations()))
+
+    def locations(self):
+        return [location for location in range(MEMORY_LOCATIONS) if self.loaded[location]]
+
+    def set(self, location, values):
+        """
+        Store MemoryValues (psi, seconds, inH2O) for a location.
+        """
+        self.pressure[location] = int(round(values.pressure * 10))
+        self.time[location] = int(round(values.time * 10000))
+        self.vacuum[location] = int(round(values.vacuum * 10))
+        self.loaded[location] = 1
+
+    def get(self, location):
+        if not self.loaded[location]:
+            return None
+        return MemoryValues(self.pressure[location] / 10.0, self.time[location] / 10000.0,
+                            self.vacuum[location] / 10.0)
+
+    def packets(self, location):
+        """
+        Frames that write a location: CH, then PS, DS and VS with data
+        strings built from the integer columns. Formatting the float values
+        instead would truncate some of them one device unit low.
+        """
+        return (
+            encode('memory_location', location),
+            encode_command(COMMANDS['pressure'].code, f'{self.pressure[location]:04d}'),
+            encode_command(COMMANDS['time'].code, f'T{self.time[location]:04d}'),
+            encode_command(COMMANDS['vacuum'].code, f'{self.vacuum[location]:04d}'),
+        )
+
+    def discard(self, location):
+        self.loaded[location] = 0
+
+    def rows(self):
+        for location in self.locations():
+            values = self.get(location)
+            yield location, values.pressure, values.time, values.vacuum
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            writer.writerows(self.rows())
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump([dict(zip(CSV_FIELDS, row)) for row in self.rows()], f, indent=2)
+
+    def save(self, path):
+        """
+        Write the table as CSV or JSON, chosen by the file extension.
+        """
+        if path.endswith('.json'):
+            self.to_json(path)
+        else:
+            self.to_csv(path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a recipe file (CSV with a location,pressure,time,vacuum header,
+        or a JSON list of objects with those keys). Values are validated
+        with the same range checks as the individual commands.
+        """
+        if path.endswith('.json'):
+            with open(path) as f:
+                records = json.load(f)
+        else:
+            with open(path, newline='') as f:
+                records = list(csv.DictReader(f))
+        table = cls()
+        for record in records:
+            location = int(record['location'])
+            values = MemoryValues(float(record['pressure']), float(record['time']), float(record['vacuum']))
+            # Raise ValueError for anything the device would reject
+            COMMANDS['memory_location'].format(location)
+            COMMANDS['pressure'].format(values.pressure)
+            COMMANDS['time'].format(values.time)
+            COMMANDS['vacuum'].format(values.vacuum)
+            table.set(location, values)
+        return table
+
+
+class MemoryCache:
+    """
+    Local copies of dispenser memory tables, one JSON file per device key
+    (e.g. the USB serial number or port). Entries stay valid until
+    invalidate() is called, e.g. after the recipes were edited on the front panel.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.logger = logging.getLogger('MemoryCache')
+        self.directory = directory
+
+    def _path(self, key):
+        safe_key = ''.join(character if character.isalnum() else '_' for character in key)
+        return os.path.join(self.directory, f'{safe_key}.json')
+
+    def load(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return MemoryTable.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f'Ignoring unreadable memory cache {path}: {e}')
+            return None
+
+    def store(self, key, table):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temporary_path = f'{path}.tmp'
+        table.to_json(temporary_path)
+        os.replace(temporary_path, path)
+
+    def invalidate(self, key, locations=None):
+        """
+        Drop the cached table for `key`, or only the given locations.
+        """
+        if locations is None:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            return
+        table = self.load(key)
+        if table is not None:
+            for location in locations:
+                table.discard(location)
+            self.store(key, table)
+
+
+class TransferStats:
+    """
+    Progress and throughput of a bulk transfer.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = []
+        self.transactions = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    @property
+    def transactions_per_second(self):
+        return self.transactions / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'locations': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'transactions': self.transactions,
+            'seconds': self.seconds,
+            'transactions_per_second': self.transactions_per_second,
+        }
+
+
+def _report(stats, progress):
+    stats.seconds = time.perf_counter() - stats.started
+    if progress:
+        progress(stats)
+
+
+def download_memory(controller, start=0, stop=MEMORY_LOCATIONS, progress=None, table=None):
+    """
+    Read locations start..stop-1 with E8 into a MemoryTable.
+
+    The protocol allows one transaction at a time, so the reads are issued
+    back to back with pre-encoded frames and no pauses. `progress` is
+    called with the TransferStats after every location. Returns
+    (table, stats); failed locations are listed in stats.failed.
+    """
+    if table is None:
+        table = MemoryTable()
+    packets = [encode('read_values', location) for location in range(start, stop)]
+    stats = TransferStats(len(packets))
+    for location, packet in zip(range(start, stop), packets):
+        response = controller.send_packet(packet, expect_response=True)
+        stats.transactions += 1
+        values = None
+        if response:
+            try:
+                values = parse_memory_values(response)
+            except ValueError:
+                pass
+        if values is None:
+            stats.failed.append(location)
+        else:
+            table.set(location, values)
+        stats.done += 1
+        _report(stats, progress)
+    _report(stats, None)
+    return table, stats
+
+
+def upload_memory(controller, table, current=None, progress=None):
+    """
+    Write every location of `table` to the device: select it with CH, then
+    set pressure (PS), time (DS) and vacuum (VS). Locations whose values
+    already match `current` (e.g. a cached or freshly downloaded table) are
+    skipped, and `current` is updated as locations are written. The device
+    is left on the last written location. Returns TransferStats; failed
+    locations are in stats.failed.
+    """
+    locations = [location for location in table.locations()
+                 if current is None or current.get(location) != table.get(location)]
+    stats = TransferStats(len(locations))
+    # These raw writes bypass the controller's shadow state
+    controller.shadow.invalidate('memory_location', *SETPOINTS)
+    for location in locations:
+        values = table.get(location)
+        for packet in table.packets(location):
+            stats.transactions += 1
+            if not controller.send_packet(packet):
+                stats.failed.append(location)
+                if current is not None:
+                    # The location may now be partially written
+                    current.discard(location)
+                break
+        else:
+            if current is not None:
+                current.set(location, values)
+        stats.done += 1
+        _report(stats, progress)
+    _report(stats, None)
+    return stats
+
+
+def _print_progress(stats):
+    if stats.done == stats.total or stats.done % 25 == 0:
+        print(f'\r{stats.done}/{stats.total} locations, {stats.transactions_per_second:.0f} transactions/s',
+              end='\n' if stats.done == stats.total else '', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk download or upload Ultimus V recipe memory')
+    parser.add_argument('--port', help='serial port, e.g. /dev/ttyUSB0 (default: connect as the CLI does)')
+    parser.add_argument('--cache-key', help='memory cache entry to use (default: the port)')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    download = subparsers.add_parser('download', help='read memory locations into a CSV/JSON file')
+    download.add_argument('--output', required=True, help='CSV or JSON file to write')
+    download.add_argument('--start', type=int, default=0)
+    download.add_argument('--stop', type=int, default=MEMORY_LOCATIONS)
+    download.add_argument('--refresh', action='store_true', help='ignore the memory cache and read the device')
+    upload = subparsers.add_parser('upload', help='write a CSV/JSON recipe file to the device')
+    upload.add_argument('recipe', help='CSV or JSON recipe file')
+    upload.add_argument('--all', action='store_true', help='write every location, even if the cache says it matches')
+    subparsers.add_parser('invalidate', help='drop the cached memory table')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    cache = MemoryCache()
+    if args.action == 'invalidate':
+        if not (args.cache_key or args.port):
+            parser.error('invalidate needs --port or --cache-key')
+        cache.invalidate(args.cache_key or args.port)
+        return
+
+    controller = DispenserController(port=args.port)
+    if not controller.ser:
+        print('No dispenser connected')
+        return
+    key = args.cache_key or controller.port
+    try:
+        if args.action == 'download':
+            table = None if args.refresh else cache.load(key)
+            wanted = range(args.start, args.stop)
+            if table is None or not all(location in table for location in wanted):
+                table, stats = download_memory(controller, args.start, args.stop, _print_progress, table)
+                cache.store(key, table)
+                if stats.failed:
+                    print(f'Failed to read locations: {stats.failed}')
+            subset = MemoryTable()
+            for location in wanted:
+                if location in table:
+                    subset.set(location, table.get(location))
+            subset.save(args.output)
+        else:
+            recipe = MemoryTable.load(args.recipe)
+            current = None if args.all else cache.load(key) or MemoryTable()
+            stats = upload_memory(controller, recipe, current, _print_progress)
+            if current is not None:
+                cache.store(key, current)
+            else:
+                cache.invalidate(key, recipe.locations())
+            if stats.failed:
+                print(f'Failed to write locations: {stats.failed}')
+    finally:
+        controller.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Typed transaction errors and the retry policy of DispenserController.
+
+DispenserController.transact() raises one of these instead of returning
+None, so callers can tell what went wrong:
+
+    try:
+        controller.transact(encode('pressure', 12.5))
+    except NoAck:
+        ...  # the device never saw the command
+    except DispenserError as e:
+        ...
+
+Failed transactions are retried with bounded, jittered exponential
+backoff. Commands the device never executed (no ACK, or an A2 reply) are
+always safe to resend. After a timeout, checksum error or disconnect the
+device may have executed the command, so only repeatable commands are
+resent: never DI (another shot, or toggles steady dispensing) or TM
+(flips the mode back).
+"""
+import random
+
+from nordson_protocol import NON_REPEATABLE_CODES
+
+
+class DispenserError(Exception):
+    """
+    A transaction did not complete. `command` is the command code, e.g. 'PS'.
+    """
+
+    def __init__(self, message, command=None):
+        super().__init__(message)
+        self.command = command
+
+
+class NoAck(DispenserError):
+    """
+    The device did not ACK the ENQ; the command was not sent.
+    """
+
+
+class DispenserTimeout(DispenserError, TimeoutError):
+    """
+    No response or data frame arrived before the deadline.
+    """
+
+
+class ChecksumError(DispenserError):
+    """
+    Only frames with a wrong checksum arrived before the deadline.
+    """
+
+
+class CommandFailed(DispenserError):
+    """
+    The device answered A2 (failure) or an unexpected command code.
+    """
+
+
+class Disconnected(DispenserError, ConnectionError):
+    """
+    The serial port failed or is not open.
+    """
+
+
+class RetryPolicy:
+    """
+    Up to `attempts` tries per transaction. Retry n waits a random time
+    between half and all of min(max_delay, base_delay * 2 ** (n - 1)).
+    After a disconnect, a retry waits up to `reconnect_wait` seconds for
+    the port to come back.
+    """
+
+    def __init__(self, attempts=3, base_delay=0.002, max_delay=0.05, reconnect_wait=1.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reconnect_wait = reconnect_wait
+
+    def should_retry(self, error, attempt, packet):
+        """
+        True if a transaction that failed with `error` on try number
+        `attempt` (1-based) should be sent again.
+        """
+        if attempt >= self.attempts:
+            return False
+        if isinstance(error, (NoAck, CommandFailed)):
+            # The device did not execute the command
+            return True
+        if isinstance(error, (DispenserTimeout, ChecksumError, Disconnected)):
+            return bytes(packet[3:5]) not in NON_REPEATABLE_CODES
+        return False
+
+    def delay(self, attempt):
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(backoff / 2, backoff)
+
+
+NO_RETRY = RetryPolicy(attempts=1)
@@ -0,0 +1,172 @@
+"""
+Precisely timed DI shots for high-cadence timed-mode dispensing.
+
+The DI frame is encoded once. Each shot waits for its monotonic deadline by
+sleeping until shortly before it and spinning for the rest, then goes out
+as a single transaction. The lateness of every trigger is recorded:
+
+    scheduler = ShotScheduler(controller)
+    report = scheduler.run(rate_deadlines(rate_hz=20, count=200))
+    print(report.summary())
+
+    python nordson_scheduler.py --port /dev/ttyUSB0 --rate 20 --count 200
+"""
+import argparse
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import Future
+
+from nordson_protocol import COMMANDS, encode
+from nordson_timing import wait_until
+
+# A shot fired later than this after its deadline counts as missed
+MISS_TOLERANCE = 0.002
+
+
+def rate_deadlines(rate_hz, count, start=None):
+    """
+    Return `count` monotonic deadlines `1 / rate_hz` apart, beginning at
+    `start` (default: 10 ms from now).
+    """
+    if rate_hz <= 0:
+        raise ValueError(f'Invalid rate: {rate_hz}. Must be greater than 0 Hz')
+    if start is None:
+        start = time.monotonic() + 0.01
+    period = 1.0 / rate_hz
+    return [start + index * period for index in range(count)]
+
+
+class ShotReport:
+    """
+    Per-shot deadline, trigger time (None if dropped), completion time and
+    result, all on the time.monotonic() clock.
+    """
+
+    def __init__(self, deadlines, miss_tolerance=MISS_TOLERANCE):
+        self.deadlines = list(deadlines)
+        self.miss_tolerance = miss_tolerance
+        self.fired = [None] * len(self.deadlines)
+        self.completed = [None] * len(self.deadlines)
+        self.ok = [False] * len(self.deadlines)
+
+    @property
+    def lateness(self):
+        return [fired - deadline for fired, deadline in zip(self.fired, self.deadlines) if fired is not None]
+
+    def summary(self):
+        """
+        Shot counts plus lateness and trigger-interval jitter in milliseconds.
+        """
+        lateness = sorted(self.lateness)
+        fired = [fired for fired in self.fired if fired is not None]
+        summary = {
+            'shots': len(self.deadlines),
+            'fired': len(fired),
+            'failed': sum(1 for fired, ok in zip(self.fired, self.ok) if fired is not None and not ok),
+            'dropped': len(self.deadlines) - len(fired),
+            'missed': sum(1 for late in lateness if late > self.miss_tolerance) + len(self.deadlines) - len(fired),
+        }
+        if len(lateness) > 1:
+            cut_points = statistics.quantiles(lateness, n=100, method='inclusive')
+            summary.update({
+                'lateness_mean_ms': statistics.fmean(lateness) * 1000,
+                'lateness_p50_ms': cut_points[49] * 1000,
+                'lateness_p95_ms': cut_points[94] * 1000,
+                'lateness_p99_ms': cut_points[98] * 1000,
+                'lateness_max_ms': lateness[-1] * 1000,
+            })
+        if len(fired) > 2:
+            intervals = [later - earlier for earlier, later in zip(fired, fired[1:])]
+            summary['interval_mean_ms'] = statistics.fmean(intervals) * 1000
+            summary['interval_jitter_ms'] = statistics.stdev(intervals) * 1000
+        return summary
+
+
+class ShotScheduler:
+    def __init__(self, controller, miss_tolerance=MISS_TOLERANCE, drop_missed=False):
+        """
+        `drop_missed=True` skips shots that are already later than
+        `miss_tolerance` instead of firing them late.
+        """
+        self.logger = logging.getLogger('ShotScheduler')
+        self.controller = controller
+        self.miss_tolerance = miss_tolerance
+        self.drop_missed = drop_missed
+        self.packet = encode('start')
+        self._stop = threading.Event()
+
+    def run(self, deadlines):
+        """
+        Fire a DI shot at each monotonic deadline, in order, and block until
+        the last one completed. Returns a ShotReport.
+        """
+        if not self.controller.is_timed_mode:
+            self.logger.warning('Not in Timed Mode; each DI toggles steady dispensing')
+        self._stop.clear()
+        report = ShotReport(sorted(deadlines), self.miss_tolerance)
+        expect_response = COMMANDS['start'].expect_response
+        for index, deadline in enumerate(report.deadlines):
+            if self._stop.is_set():
+                break
+            lateness = wait_until(deadline)
+            if self.drop_missed and lateness > self.miss_tolerance:
+                continue
+            report.fired[index] = time.monotonic()
+            report.ok[index] = bool(self.controller.send_packet(self.packet, expect_response))
+            report.completed[index] = time.monotonic()
+        return report
+
+    def run_in_background(self, deadlines):
+        """
+        Run the schedule on its own thread. Returns a Future for the ShotReport.
+        """
+        future = Future()
+
+        def target():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self.run(deadlines))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, name='ShotScheduler', daemon=True).start()
+        return future
+
+    def stop(self):
+        """
+        Stop a running schedule after the current shot; remaining shots are
+        reported as dropped.
+        """
+        self._stop.set()
+
+
+def main():
+    from nordson_dispenser_control import DispenserController
+
+    parser = argparse.ArgumentParser(description='Fire timed DI shots at a fixed rate')
+    parser.add_argument('--port', help='serial port, e.g. /dev/ttyUSB0')
+    parser.add_argument('--rate', type=float, required=True, help='shots per second')
+    parser.add_argument('--count', type=int, required=True, help='number of shots')
+    parser.add_argument('--tolerance', type=float, default=MISS_TOLERANCE * 1000,
+                        help='lateness in ms after which a shot counts as missed')
+    parser.add_argument('--drop-missed', action='store_true', help='skip missed shots instead of firing late')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    controller = DispenserController(port=args.port)
+    scheduler = ShotScheduler(controller, args.tolerance / 1000, args.drop_missed)
+    try:
+        report = scheduler.run(rate_deadlines(args.rate, args.count))
+    except KeyboardInterrupt:
+        return
+    finally:
+        controller.destroy()
+    for name, value in report.summary().items():
+        print(f'{name}: {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Shadow copy of the dispenser state as the device acknowledged it.
+
+Values change only when the device answers A0 (or when read back with E8),
+so a write whose value already matches a confirmed shadow value can be
+skipped without changing what the device does.
+"""
+from nordson_protocol import COMMANDS
+
+# Setpoints stored per memory location; they become unknown when another
+# location is selected or the units change
+SETPOINTS = ('pressure', 'time', 'vacuum')
+
+# Shadow fields that a write command with the same registry name sets
+FIELDS = SETPOINTS + ('pressure_units', 'vacuum_units', 'memory_location')
+
+
+def read_back_data(name, value):
+    """
+    PS/DS/VS data string for a setpoint read back with E8, in the device
+    units of the reply. Not range checked: setpoints read in bar or kPa can
+    be outside the psi range of format_pressure().
+    """
+    if name == 'time':
+        return f'T{round(value * 10000):04d}'
+    return f'{round(value * 10):04d}'
+
+
+class DeviceShadow:
+    """
+    Current setpoints, units, mode and memory location. A value of None
+    means unknown. Values restored from elsewhere (e.g. the port cache) are
+    kept for information but are not trusted for skipping writes until the
+    device confirms them.
+    """
+
+    def __init__(self):
+        self.pressure = None
+        self.time = None
+        self.vacuum = None
+        self.pressure_units = None
+        self.vacuum_units = None
+        self.memory_location = None
+        self.timed_mode = True  # Assume starting in Timed Mode
+        self._confirmed = set()
+        # Data strings (device units) of the confirmed FIELDS
+        self._data = {}
+        self.skipped_writes = 0
+
+    def is_current(self, name, value):
+        """
+        True if writing `value` with command `name` would not change the
+        device. The data string that would be sent is compared with the
+        confirmed one, so 12.51 and 12.5 psi are the same setpoint. Raises
+        ValueError for invalid values.
+        """
+        if name not in FIELDS:
+            return False
+        return COMMANDS[name].format(value) == self._data.get(name)
+
+    def apply(self, name, value):
+        """
+        Record a write that the device acknowledged with A0.
+        """
+        if name == 'toggle_mode':
+            self.timed_mode = not self.timed_mode
+            self._confirmed.add('timed_mode')
+            return
+        if name not in FIELDS:
+            return
+        if isinstance(value, str):
+            value = value.lower()
+        if name == 'memory_location' and value != self.memory_location:
+            self.invalidate(*SETPOINTS)
+        elif name == 'pressure_units' and value != self.pressure_units:
+            self.invalidate('pressure')
+        elif name == 'vacuum_units' and value != self.vacuum_units:
+            self.invalidate('vacuum')
+        setattr(self, name, value)
+        self._confirmed.add(name)
+        self._data[name] = COMMANDS[name].format(value)
+
+    def observe(self, values):
+        """
+        Record setpoints read back from the active memory location (E8).
+        """
+        for name in SETPOINTS:
+            value = getattr(values, name)
+            setattr(self, name, value)
+            self._confirmed.add(name)
+            self._data[name] = read_back_data(name, value)
+
+    def restore(self, **state):
+        """
+        Load unconfirmed state, e.g. restore(timed_mode=False, pressure_units='bar').
+        """
+        for name, value in state.items():
+            setattr(self, name, value)
+            self._confirmed.discard(name)
+            self._data.pop(name, None)
+
+    def invalidate(self, *names):
+        """
+        Mark fields unknown, e.g. after a write that timed out. Without
+        names, everything becomes unknown; the mode keeps its assumed value
+        but is no longer confirmed.
+        """
+        for name in names or FIELDS + ('timed_mode',):
+            if name in FIELDS:
+                setattr(self, name, None)
+            self._confirmed.discard(name)
+            self._data.pop(name, None)
+
+    def is_confirmed(self, name):
+        return name in self._confirmed
+
+    def as_dict(self):
+        state = {name: getattr(self, name) for name in FIELDS + ('timed_mode',)}
+        state['confirmed'] = sorted(self._confirmed)
+        return state
@@ -0,0 +1,291 @@
+"""
+Continuous E8 telemetry for SPC analysis.
+
+TelemetryPoller reads a memory location back-to-back as fast as the link
+allows. Samples go into a preallocated NumPy ring buffer for live use and,
+optionally, into a memory-mapped log file that can hold a whole shift:
+
+    python nordson_telemetry.py record shift.ntl --port /dev/ttyUSB0 --duration 28800
+    python nordson_telemetry.py show shift.ntl --csv shift.csv
+
+Log layout: a 32-byte header (magic, version, record size, record count)
+followed by packed TELEMETRY_DTYPE records. The count is updated after
+every record, so a log cut short by a crash can still be read.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+TELEMETRY_DTYPE = np.dtype([
+    ('timestamp', 'f8'),  # time.time() when the read started
+    ('location', 'u2'),
+    ('pressure', 'f4'),
+    ('time', 'f4'),
+    ('vacuum', 'f4'),
+    ('latency', 'f4'),  # seconds for the whole E8 transaction
+])
+
+LOG_MAGIC = b'NUTL'
+LOG_VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('record_size', '<u4'),
+    ('reserved', '<u4'),
+    ('count', '<u8'),
+    ('padding', 'V8'),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+# Records added to the log file each time it runs out of room
+LOG_GROWTH = 65536
+
+
+class SampleRing:
+    """
+    Fixed-size ring buffer of TELEMETRY_DTYPE samples. Appending overwrites
+    the oldest sample once the buffer is full; nothing is allocated per sample.
+    """
+
+    def __init__(self, capacity=100000):
+        self.samples = np.zeros(capacity, dtype=TELEMETRY_DTYPE)
+        self.capacity = capacity
+        self.total = 0
+
+    def append(self, timestamp, location, pressure, time_value, vacuum, latency):
+        self.samples[self.total % self.capacity] = (timestamp, location, pressure, time_value, vacuum, latency)
+        self.total += 1
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def latest(self, count=None):
+        """
+        Return a copy of the newest `count` samples (all by default), oldest first.
+        """
+        available = len(self)
+        count = available if count is None else min(count, available)
+        end = self.total % self.capacity
+        indices = np.arange(end - count, end) % self.capacity
+        return self.samples[indices]
+
+
+class TelemetryLog:
+    """
+    Append-only, memory-mapped log of TELEMETRY_DTYPE records. Opening an
+    existing log appends to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER_SIZE:
+            with open(path, 'wb') as f:
+                header = np.zeros(1, dtype=HEADER_DTYPE)
+                header['magic'] = LOG_MAGIC
+                header['version'] = LOG_VERSION
+                header['record_size'] = TELEMETRY_DTYPE.itemsize
+                f.write(header.tobytes())
+        self._header = np.memmap(path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        _check_header(self._header[0], path)
+        self.count = int(self._header['count'][0])
+        self._records = None
+        self._map(max(self.count, LOG_GROWTH))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _map(self, capacity):
+        if self._records is not None:
+            self._records.flush()
+            self._records = None
+        size = HEADER_SIZE + capacity * TELEMETRY_DTYPE.itemsize
+        with open(self.path, 'r+b') as f:
+            f.truncate(size)
+        self._records = np.memmap(self.path, dtype=TELEMETRY_DTYPE, mode='r+', offset=HEADER_SIZE,
+                                  shape=(capacity,))
+
+    def append(self, record):
+        if self.count == len(self._records):
+            self._map(self.count + LOG_GROWTH)
+        self._records[self.count] = record
+        self.count += 1
+        self._header['count'] = self.count
+
+    def flush(self):
+        self._records.flush()
+        self._header.flush()
+
+    def close(self):
+        """
+        Flush and trim the preallocated space after the last record.
+        """
+        if self._records is None:
+            return
+        self.flush()
+        self._records = None
+        self._header = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + self.count * TELEMETRY_DTYPE.itemsize)
+
+
+def _check_header(header, path):
+    if header['magic'] != LOG_MAGIC:
+        raise ValueError(f'{path} is not a telemetry log')
+    if header['version'] != LOG_VERSION or header['record_size'] != TELEMETRY_DTYPE.itemsize:
+        raise ValueError(f'{path} has unsupported version {header["version"]}')
+
+
+def read_log(path):
+    """
+    Return the records of a telemetry log as a read-only memory-mapped
+    array. Nothing is loaded until the data is accessed.
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0:
+        raise ValueError(f'{path} is not a telemetry log')
+    _check_header(header[0], path)
+    count = int(header['count'][0])
+    if count == 0:
+        return np.zeros(0, dtype=TELEMETRY_DTYPE)
+    return np.memmap(path, dtype=TELEMETRY_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+def summarize(records):
+    """
+    Mean, standard deviation, minimum and maximum of each measured column.
+    """
+    summary = {'samples': len(records)}
+    if len(records) == 0:
+        return summary
+    summary['duration_s'] = float(records['timestamp'][-1] - records['timestamp'][0])
+    summary['rate_hz'] = (len(records) - 1) / summary['duration_s'] if summary['duration_s'] > 0 else None
+    for column in ('pressure', 'time', 'vacuum', 'latency'):
+        values = records[column].astype(np.float64)
+        summary[column] = {
+            'mean': float(values.mean()),
+            'std': float(values.std()),
+            'min': float(values.min()),
+            'max': float(values.max()),
+        }
+    return summary
+
+
+class TelemetryPoller:
+    """
+    Polls one memory location with E8 reads on a background thread (start()
+    / stop()) or in the calling thread (run()). Failed reads are counted,
+    not recorded.
+    """
+
+    def __init__(self, controller, memory_location=None, capacity=100000, log_path=None):
+        self.logger = logging.getLogger('TelemetryPoller')
+        self.controller = controller
+        if memory_location is None:
+            memory_location = controller.shadow.memory_location or 0
+        self.memory_location = memory_location
+        self.ring = SampleRing(capacity)
+        self.log = TelemetryLog(log_path) if log_path else None
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self):
+        """
+        Read the location once and record the sample. Returns MemoryValues,
+        or None if the read failed.
+        """
+        timestamp = time.time()
+        start = time.monotonic()
+        values = self.controller.read_memory(self.memory_location)
+        latency = time.monotonic() - start
+        if values is None:
+            self.failures += 1
+            return None
+        self.ring.append(timestamp, self.memory_location, values.pressure, values.time, values.vacuum, latency)
+        if self.log:
+            self.log.append(self.ring.samples[(self.ring.total - 1) % self.ring.capacity])
+        return values
+
+    def run(self, duration=None, samples=None):
+        """
+        Poll until stop() is called, `duration` seconds have passed or
+        `samples` reads were attempted.
+        """
+        deadline = time.monotonic() + duration if duration is not None else None
+        attempts = 0
+        while not self._stop.is_set():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if samples is not None and attempts >= samples:
+                break
+            self.poll_once()
+            attempts += 1
+        if self.log:
+            self.log.flush()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='TelemetryPoller', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        if self.log:
+            self.log.close()
+            self.log = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record and inspect Ultimus V telemetry logs')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    record = subparsers.add_parser('record', help='poll E8 and append to a log')
+    record.add_argument('log', help='telemetry log file')
+    record.add_argument('--port', help='serial port, e.g. /dev/ttyUSB0')
+    record.add_argument('--location', type=int, default=None, help='memory location to poll (default: active)')
+    record.add_argument('--duration', type=float, default=None, help='seconds to record (default: until Ctrl-C)')
+
+    show = subparsers.add_parser('show', help='summarize a log')
+    show.add_argument('log', help='telemetry log file')
+    show.add_argument('--csv', help='also export the records to this CSV file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.action == 'record':
+        from nordson_dispenser_control import DispenserController
+
+        controller = DispenserController(port=args.port)
+        poller = TelemetryPoller(controller, args.location, log_path=args.log)
+        try:
+            poller.run(duration=args.duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            poller.close()
+            controller.destroy()
+        print(f'Recorded {poller.ring.total} samples ({poller.failures} failed reads) to {args.log}')
+        return
+
+    records = read_log(args.log)
+    for name, value in summarize(records).items():
+        print(f'{name}: {value}')
+    if args.csv:
+        np.savetxt(args.csv, records, delimiter=',', fmt=['%.6f', '%d', '%.1f', '%.4f', '%.1f', '%.6f'],
+                   header=','.join(TELEMETRY_DTYPE.names), comments='')
+
+
+if __name__ == '__main__':
+    main()
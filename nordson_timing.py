@@ -0,0 +1,21 @@
+"""
+Deadline helpers on the monotonic clock.
+"""
+import time
+
+# Sleep until this close to a deadline, then spin; OS sleeps overshoot by
+# tens of microseconds to milliseconds depending on the platform
+SPIN_THRESHOLD = 0.001
+
+
+def wait_until(deadline, spin_threshold=SPIN_THRESHOLD):
+    """
+    Block until time.monotonic() reaches `deadline`. Returns the lateness in
+    seconds (how far past the deadline it returned, 0 or more).
+    """
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return -remaining
+        if remaining > spin_threshold:
+            time.sleep(remaining - spin_threshold)
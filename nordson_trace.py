@@ -0,0 +1,199 @@
+"""
+Fixed-size ring buffer of the raw bytes sent to and received from a
+dispenser, for diagnosing link problems after the fact.
+
+Recording costs one tuple append per write or read, so the trace can stay
+enabled in production. Dumps use a compact binary format, decoded offline:
+
+    python nordson_trace.py trace.bin
+
+File layout: the magic b'NUTR' and a version byte, then one record per
+write or read: timestamp (monotonic ns, u64), direction (u8), length (u16)
+and the raw bytes. Captures (nordson_capture.py) also contain EVENT
+records, whose data is a JSON description of a controller call.
+"""
+import argparse
+import os
+import struct
+import time
+from collections import deque, namedtuple
+
+from nordson_protocol import ENQ, ACK, EOT, STX, ETX
+
+TRACE_MAGIC = b'NUTR'
+TRACE_VERSION = 1
+RECORD_HEADER = struct.Struct('<QBH')
+
+TX = 0
+RX = 1
+EVENT = 2
+DIRECTIONS = {TX: 'TX', RX: 'RX', EVENT: '--'}
+
+TraceRecord = namedtuple('TraceRecord', ['timestamp_ns', 'direction', 'data'])
+
+CONTROL_NAMES = {ENQ[0]: 'ENQ', ACK[0]: 'ACK', EOT[0]: 'EOT'}
+
+
+class TraceBuffer:
+    """
+    Keeps the last `capacity` writes and reads. Oldest records are dropped
+    when the buffer is full.
+    """
+
+    def __init__(self, capacity=4096):
+        self.records = deque(maxlen=capacity)
+
+    def tx(self, data):
+        self.records.append((time.monotonic_ns(), TX, bytes(data)))
+
+    def rx(self, data):
+        self.records.append((time.monotonic_ns(), RX, bytes(data)))
+
+    def clear(self):
+        self.records.clear()
+
+    def __len__(self):
+        return len(self.records)
+
+    def dump(self, path):
+        """
+        Write the buffered records to `path` (replaced atomically).
+        """
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as f:
+            write_records(f, list(self.records))
+        os.replace(temporary_path, path)
+
+
+def write_records(f, records):
+    f.write(TRACE_MAGIC + bytes([TRACE_VERSION]))
+    for timestamp_ns, direction, data in records:
+        f.write(RECORD_HEADER.pack(timestamp_ns, direction, len(data)))
+        f.write(data)
+
+
+def load_trace(path):
+    """
+    Return the records of a trace file as a list of TraceRecord.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if content[:4] != TRACE_MAGIC:
+        raise ValueError(f'{path} is not a trace file')
+    if content[4] != TRACE_VERSION:
+        raise ValueError(f'{path} has unsupported trace version {content[4]}')
+    records = []
+    offset = 5
+    while offset < len(content):
+        if offset + RECORD_HEADER.size > len(content):
+            raise ValueError(f'{path} is truncated')
+        timestamp_ns, direction, length = RECORD_HEADER.unpack_from(content, offset)
+        offset += RECORD_HEADER.size
+        records.append(TraceRecord(timestamp_ns, direction, content[offset:offset + length]))
+        offset += length
+    return records
+
+
+class _StreamTokenizer:
+    """
+    Splits one direction's byte stream into control bytes, frames and
+    stray bytes. A frame split across several reads is joined first; an STX
+    or control byte before its ETX ends it as truncated.
+    """
+
+    def __init__(self):
+        self.frame = None
+
+    def tokens(self, data):
+        tokens = []
+        stray = bytearray()
+        for byte in data:
+            if self.frame is not None:
+                if byte == STX[0] or byte in CONTROL_NAMES:
+                    # Never part of a frame: the ETX was lost
+                    tokens.append(describe_truncated_frame(bytes(self.frame)))
+                    self.frame = None
+                else:
+                    self.frame.append(byte)
+                    if byte == ETX[0]:
+                        tokens.append(describe_frame(bytes(self.frame)))
+                        self.frame = None
+                    continue
+            if byte == STX[0]:
+                if stray:
+                    tokens.append(f'?{stray.hex()}')
+                    stray = bytearray()
+                self.frame = bytearray([byte])
+            elif byte in CONTROL_NAMES:
+                if stray:
+                    tokens.append(f'?{stray.hex()}')
+                    stray = bytearray()
+                tokens.append(CONTROL_NAMES[byte])
+            else:
+                stray.append(byte)
+        if stray:
+            tokens.append(f'?{stray.hex()}')
+        return tokens
+
+
+def describe_truncated_frame(frame):
+    """
+    Pretty-print the bytes of a frame that ended without its ETX.
+    """
+    return f"[{frame[1:].decode('ascii', errors='replace')!r} truncated, no ETX]"
+
+
+def describe_frame(frame):
+    """
+    Pretty-print a STX...ETX frame and check its length and checksum.
+    """
+    body = frame[1:-1]
+    if len(body) < 4:
+        return f'<frame {frame.hex()} too short>'
+    length_field, payload, checksum_field = body[:2], body[2:-2], body[-2:]
+    text = payload.decode('ascii', errors='replace')
+    problems = []
+    try:
+        if int(length_field, 16) != len(payload):
+            problems.append(f'length {length_field.decode("ascii", errors="replace")} != {len(payload)}')
+        expected = (-sum(length_field + payload)) & 0xFF
+        if int(checksum_field, 16) != expected:
+            problems.append(f'checksum {checksum_field.decode("ascii", errors="replace")} != {expected:02X}')
+    except ValueError:
+        problems.append('non-hex length or checksum')
+    status = ', '.join(problems) if problems else 'ok'
+    return f'[{text!r} {status}]'
+
+
+def format_trace(records):
+    """
+    Yield one line per record: time since the first record, direction and
+    the decoded control bytes and frames.
+    """
+    if not records:
+        return
+    tokenizers = {TX: _StreamTokenizer(), RX: _StreamTokenizer()}
+    start = records[0].timestamp_ns
+    previous = start
+    for record in records:
+        if record.direction in tokenizers:
+            tokens = tokenizers[record.direction].tokens(record.data)
+        else:
+            tokens = [record.data.decode('utf-8', errors='replace')]
+        elapsed_ms = (record.timestamp_ns - start) / 1e6
+        delta_us = (record.timestamp_ns - previous) / 1e3
+        previous = record.timestamp_ns
+        yield (f'{elapsed_ms:12.3f} ms (+{delta_us:9.1f} us) {DIRECTIONS.get(record.direction, "??")} '
+               f"{' '.join(tokens) if tokens else '...'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pretty-print a dispenser serial trace')
+    parser.add_argument('trace', help='trace file written by DispenserController.dump_trace')
+    args = parser.parse_args()
+    for line in format_trace(load_trace(args.trace)):
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Background I/O worker that owns a DispenserController's serial port.
+
+Callers queue commands and get concurrent.futures.Future objects back, so a
+control loop never blocks on the serial link. Pending pressure, vacuum and
+time writes are merged so only the newest value is sent; every other
+command (DI, TM, CH, E8, ...) is executed exactly once, in order. With
+merge=False every call is executed, in submission order (plain FIFO):
+
+    worker = DispenserWorker(controller)
+    for psi in ramp:
+        worker.submit('set_pressure', psi)   # returns immediately
+    worker.submit('start').result()
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from nordson_protocol import COMMANDS
+
+# Controller methods whose pending calls can be merged (latest value wins),
+# mapped to the registry command used to validate their value
+MERGEABLE = {
+    'set_pressure': 'pressure',
+    'set_vacuum': 'vacuum',
+    'set_time': 'time',
+}
+
+
+class _Request:
+    __slots__ = ('method', 'args', 'kwargs', 'futures')
+
+    def __init__(self, method, args, kwargs, future):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.futures = [future]
+
+
+class DispenserWorker:
+    def __init__(self, controller, name='DispenserWorker', merge=True):
+        self.logger = logging.getLogger('DispenserWorker')
+        self.controller = controller
+        self.merge = merge
+        self._queue = deque()
+        # Mergeable requests queued since the last non-mergeable one; merging
+        # never moves a write across a command that must stay in order
+        self._mergeable = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self.submitted = 0
+        self.merged = 0
+        self.executed = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Queue a controller method call, e.g. submit('set_pressure', 12.5).
+        Returns a Future with the method's result. A merged write's future
+        resolves with the result of the newer write that replaced it.
+        Invalid setpoints raise ValueError here, before anything is queued.
+        """
+        if not callable(getattr(self.controller, method, None)):
+            raise AttributeError(f'DispenserController has no method {method}')
+        key = MERGEABLE.get(method)
+        if key is not None and args:
+            COMMANDS[key].format(args[0])
+        if not self.merge:
+            key = None
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('DispenserWorker is closed')
+            self.submitted += 1
+            pending = self._mergeable.get(method) if key is not None else None
+            if pending is not None:
+                # Latest value wins; the queued slot is reused
+                pending.args = args
+                pending.kwargs = kwargs
+                pending.futures.append(future)
+                self.merged += 1
+                return future
+            request = _Request(method, args, kwargs, future)
+            self._queue.append(request)
+            if key is not None:
+                self._mergeable[method] = request
+            else:
+                self._mergeable.clear()
+            self._condition.notify()
+        return future
+
+    @property
+    def pending(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                request = self._queue.popleft()
+                if self._mergeable.get(request.method) is request:
+                    # Being sent now; later calls start a new slot
+                    del self._mergeable[request.method]
+            futures = [future for future in request.futures if future.set_running_or_notify_cancel()]
+            if not futures:
+                continue
+            try:
+                result = getattr(self.controller, request.method)(*request.args, **request.kwargs)
+            except Exception as e:
+                self.logger.error(f'{request.method} failed: {e}')
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future in futures:
+                    future.set_result(result)
+            self.executed += 1
+
+    def close(self, cancel_pending=False):
+        """
+        Stop the worker after the queued commands have run, or cancel them
+        with cancel_pending=True. Waits for the worker thread to finish.
+        """
+        with self._condition:
+            self._closed = True
+            if cancel_pending:
+                for request in self._queue:
+                    for future in request.futures:
+                        future.cancel()
+                self._queue.clear()
+                self._mergeable.clear()
+            self._condition.notify()
+        self._thread.join()
@@ -0,0 +1,44 @@
+"""
+Shared fixtures: an emulated dispenser that records the commands it
+executed, and a controller connected to it.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nordson_dispenser_control import DispenserController  # noqa: E402
+from nordson_emulator import UltimusEmulator  # noqa: E402
+
+
+class RecordingEmulator(UltimusEmulator):
+    """
+    UltimusEmulator that keeps the payload of every command it executed.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.commands = []
+
+    def _handle_command(self, payload):
+        self.commands.append(payload)
+        super()._handle_command(payload)
+
+    def codes(self):
+        return [payload[:2].decode('ascii') for payload in self.commands]
+
+
+@pytest.fixture
+def emulator():
+    with RecordingEmulator() as emulator:
+        yield emulator
+
+
+@pytest.fixture
+def controller(emulator):
+    controller = DispenserController(port=emulator.port, init_delay=0, port_cache_path=None,
+                                     ack_timeout=0.05, response_timeout=0.05)
+    yield controller
+    controller.destroy()
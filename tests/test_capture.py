@@ -0,0 +1,47 @@
+import time
+
+from nordson_capture import SerialCapture, replay_capture, start_capture, stop_capture
+from nordson_trace import EVENT, load_trace
+
+
+def record_session(controller):
+    controller.set_pressure(12.5)
+    controller.set_time(0.05)
+    controller.read_memory(0)
+    controller.start()
+    controller.probe()
+
+
+def test_capture_replays_identically(controller, tmp_path):
+    path = str(tmp_path / 'session.bin')
+    start_capture(controller, path)
+    record_session(controller)
+    stop_capture(controller)
+    assert 'send_packet' not in controller.__dict__
+
+    report = replay_capture(path)
+    assert report['calls'] == 5
+    assert report['mismatches'] == []
+    assert report['tx_mismatches'] == 0
+    assert report['unread_rx_bytes'] == 0
+
+
+def test_capture_continues_after_a_reconnect(controller, tmp_path):
+    path = str(tmp_path / 'reconnect.bin')
+    capture = start_capture(controller, path)
+    assert controller.set_pressure(10)
+    with controller.lock:
+        # Drop the underlying port; the controller reopens the same device
+        controller.ser.ser.close()
+    controller.set_pressure(11)
+    deadline = time.monotonic() + 2
+    while not controller.set_pressure(12) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert controller.reconnects >= 1
+    assert isinstance(controller.ser, SerialCapture)
+    stop_capture(controller)
+    assert capture._file.closed
+
+    events = [record for record in load_trace(path) if record.direction == EVENT]
+    assert len(events) >= 3
+    assert b'"result": true' in events[-1].data
@@ -0,0 +1,72 @@
+import random
+
+from nordson_protocol import ENQ, ACK, EOT, FrameDecoder, encode, encode_frame
+from nordson_trace import _StreamTokenizer
+
+PAYLOADS = [b'A0', b'D0PD0125DT00500VC0030', b'A2', b'PS  0500']
+
+
+def stream():
+    return b''.join(encode_frame(payload) for payload in PAYLOADS)
+
+
+def test_frames_split_at_every_byte():
+    decoder = FrameDecoder()
+    payloads = []
+    for byte in stream():
+        payloads += decoder.feed(bytes((byte,)))
+    assert payloads == PAYLOADS
+    assert decoder.buffered == 0
+
+
+def test_random_splits_match_a_single_feed():
+    data = stream() * 20
+    rng = random.Random(1)
+    decoder = FrameDecoder()
+    payloads = []
+    offset = 0
+    while offset < len(data):
+        size = rng.randint(1, 9)
+        payloads += decoder.feed(memoryview(data)[offset:offset + size])
+        offset += size
+    assert payloads == FrameDecoder().feed(data) == PAYLOADS * 20
+
+
+def test_corrupt_checksum_is_counted_and_skipped():
+    corrupt = bytearray(encode_frame(b'A0'))
+    corrupt[-2] = ord('0') if corrupt[-2] != ord('0') else ord('1')
+    decoder = FrameDecoder()
+    assert decoder.feed(bytes(corrupt) + encode_frame(b'A2')) == [b'A2']
+    assert decoder.checksum_errors == 1
+
+
+def test_noise_between_frames_is_discarded():
+    decoder = FrameDecoder()
+    data = b'\x00garbage' + encode_frame(b'A0') + b'\xff\x13' + encode_frame(b'A2')
+    assert decoder.feed(data) == [b'A0', b'A2']
+
+
+def test_early_etx_in_a_split_frame():
+    frame = encode_frame(b'D0PD0125DT00500VC0030')
+    # The frame loses its tail; the next frame follows directly
+    truncated = frame[:10] + b'\x03'
+    decoder = FrameDecoder()
+    payloads = decoder.feed(truncated[:6]) + decoder.feed(truncated[6:]) + decoder.feed(encode_frame(b'A0'))
+    assert payloads == [b'A0']
+    assert decoder.framing_errors + decoder.checksum_errors >= 1
+
+
+def test_decoder_reads_emulator_replies(controller, emulator):
+    assert controller.set_pressure(12.5)
+    values = controller.read_memory(0)
+    assert values.pressure == 12.5
+    assert emulator.commands == [encode('pressure', 12.5)[3:-3], encode('read_values', 0)[3:-3]]
+
+
+def test_trace_reports_frame_truncated_by_control_byte():
+    tokenizer = _StreamTokenizer()
+    frame = encode_frame(b'A0')
+    tokens = tokenizer.tokens(ENQ + ACK + frame[:4]) + tokenizer.tokens(EOT + frame)
+    assert tokens[:2] == ['ENQ', 'ACK']
+    assert tokens[2].endswith('truncated, no ETX]')
+    assert tokens[3:] == ['EOT', "['A0' ok]"]
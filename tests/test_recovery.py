@@ -0,0 +1,46 @@
+import pytest
+
+from nordson_protocol import encode
+from nordson_recovery import (ChecksumError, CommandFailed, Disconnected, DispenserTimeout, NoAck,
+                              RetryPolicy)
+
+
+def test_no_ack_is_retried(controller, emulator):
+    emulator.drop_rate = 1.0
+    with pytest.raises(NoAck):
+        controller.transact(encode('pressure', 10), retry_policy=RetryPolicy(attempts=3, base_delay=0))
+    errors = controller.metrics.snapshot()['commands']['PS']['errors']
+    assert errors['missing_ack'] == 3
+    assert errors['retry'] == 2
+    assert emulator.commands == []
+
+
+def test_bad_checksum_is_retried_for_writes(controller, emulator):
+    emulator.corrupt_rate = 1.0
+    with pytest.raises(ChecksumError):
+        controller.transact(encode('pressure', 10), retry_policy=RetryPolicy(attempts=3, base_delay=0))
+    assert emulator.codes() == ['PS', 'PS', 'PS']
+
+
+@pytest.mark.parametrize('name', ['start', 'toggle_mode'])
+def test_dispense_and_mode_toggle_are_never_resent(controller, emulator, name):
+    # The device executed the command; only its A0 was corrupted
+    emulator.corrupt_rate = 1.0
+    with pytest.raises(ChecksumError):
+        controller.transact(encode(name), retry_policy=RetryPolicy(attempts=3, base_delay=0))
+    assert len(emulator.commands) == 1
+
+
+@pytest.mark.parametrize('error', [DispenserTimeout, ChecksumError, Disconnected])
+def test_policy_never_repeats_di_or_tm_after_an_uncertain_failure(error):
+    policy = RetryPolicy(attempts=3)
+    assert not policy.should_retry(error('lost', 'DI'), 1, encode('start'))
+    assert not policy.should_retry(error('lost', 'TM'), 1, encode('toggle_mode'))
+    assert policy.should_retry(error('lost', 'PS'), 1, encode('pressure', 10))
+
+
+@pytest.mark.parametrize('error', [NoAck, CommandFailed])
+def test_policy_repeats_commands_the_device_did_not_execute(error):
+    policy = RetryPolicy(attempts=3)
+    assert policy.should_retry(error('refused', 'DI'), 1, encode('start'))
+    assert not policy.should_retry(error('refused', 'DI'), 3, encode('start'))
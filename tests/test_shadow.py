@@ -0,0 +1,50 @@
+from nordson_shadow import DeviceShadow
+
+
+def test_duplicate_write_is_skipped(controller, emulator):
+    assert controller.set_pressure(12.5)
+    assert controller.set_pressure(12.5)
+    # Same data string on the wire, so the same setpoint
+    assert controller.set_pressure(12.51)
+    assert emulator.codes() == ['PS']
+    assert controller.shadow.skipped_writes == 2
+
+
+def test_changed_and_forced_writes_are_sent(controller, emulator):
+    assert controller.set_pressure(12.5)
+    assert controller.set_pressure(13.0)
+    assert controller.set_pressure(13.0, force=True)
+    assert emulator.codes() == ['PS', 'PS', 'PS']
+
+
+def test_memory_change_invalidates_setpoints(controller, emulator):
+    assert controller.set_time(0.05)
+    assert controller.select_memory(2)
+    assert controller.set_time(0.05)
+    assert emulator.codes() == ['DS', 'CH', 'DS']
+
+
+def test_read_back_values_are_trusted(controller, emulator):
+    emulator.memory[3] = [250, 1000, 40]
+    values = controller.sync_shadow(3)
+    assert values.pressure == 25.0
+    assert controller.set_pressure(25.0)
+    assert controller.set_vacuum(4.0)
+    assert emulator.codes() == ['E8']
+
+
+def test_unanswered_write_is_not_trusted(controller, emulator):
+    assert controller.set_pressure(12.5)
+    emulator.drop_rate = 1.0
+    assert not controller.set_pressure(20.0)
+    assert not controller.shadow.is_confirmed('pressure')
+    emulator.drop_rate = 0.0
+    assert controller.set_pressure(12.5)
+    assert emulator.codes() == ['PS', 'PS']
+
+
+def test_restored_state_is_not_trusted():
+    shadow = DeviceShadow()
+    shadow.restore(pressure_units='bar')
+    assert shadow.pressure_units == 'bar'
+    assert not shadow.is_current('pressure_units', 'bar')
@@ -0,0 +1,47 @@
+from nordson_protocol import encode
+from nordson_worker import DispenserWorker
+
+
+def payload(name, value=None):
+    return encode(name, value)[3:-3]
+
+
+def queue_behind_start(controller, worker):
+    # The worker blocks in start() until the controller lock is released,
+    # so every later call is still queued when it is submitted
+    with controller.lock:
+        futures = [worker.submit('start')]
+        futures += [worker.submit('set_pressure', psi) for psi in (10, 20, 30)]
+        futures.append(worker.submit('start'))
+        futures.append(worker.submit('set_pressure', 40))
+    return futures
+
+
+def test_pending_writes_merge_but_never_cross_other_commands(controller, emulator):
+    with DispenserWorker(controller) as worker:
+        futures = queue_behind_start(controller, worker)
+    assert all(future.result() for future in futures)
+    assert emulator.commands == [payload('start'), payload('pressure', 30),
+                                 payload('start'), payload('pressure', 40)]
+    assert worker.merged == 2
+    assert worker.executed == 4
+
+
+def test_without_merging_every_write_is_sent_in_order(controller, emulator):
+    with DispenserWorker(controller, merge=False) as worker:
+        futures = queue_behind_start(controller, worker)
+    assert all(future.result() for future in futures)
+    assert emulator.commands == [payload('start'), payload('pressure', 10), payload('pressure', 20),
+                                 payload('pressure', 30), payload('start'), payload('pressure', 40)]
+    assert worker.merged == 0
+
+
+def test_invalid_setpoint_is_rejected_before_queueing(controller):
+    with DispenserWorker(controller) as worker:
+        try:
+            worker.submit('set_pressure', 200)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('ValueError not raised')
+        assert worker.submitted == 0